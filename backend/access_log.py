@@ -0,0 +1,121 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger('OPACSpider')
+
+# 内存中等待写入的访问日志上限，队列已满时丢弃新记录
+ACCESS_LOG_QUEUE_SIZE = int(os.environ.get('OPAC_ACCESS_LOG_QUEUE_SIZE', '10000'))
+# 每批最多写入的记录数，以及最长等待多少秒写入一次
+ACCESS_LOG_BATCH_SIZE = int(os.environ.get('OPAC_ACCESS_LOG_BATCH_SIZE', '200'))
+ACCESS_LOG_FLUSH_INTERVAL = float(os.environ.get('OPAC_ACCESS_LOG_FLUSH_INTERVAL', '1'))
+
+
+class AccessLogWriter:
+    """在后台线程中批量写入访问日志，请求线程只把记录放入内存队列
+
+    攒够batch_size条或距上次写入超过flush_interval秒时，用一个事务写入一批记录。
+    队列已满（数据库写入跟不上）时丢弃新记录并计数，不阻塞请求。
+    访问时间在入队时记录，与写入时间无关；进程退出时写完队列中剩余的记录。
+    """
+
+    def __init__(self, db, queue_size=ACCESS_LOG_QUEUE_SIZE, batch_size=ACCESS_LOG_BATCH_SIZE,
+                 flush_interval=ACCESS_LOG_FLUSH_INTERVAL):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        # dropped由各请求线程并发修改，需加锁
+        self._dropped_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self._thread = threading.Thread(target=self._loop, name='access-log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, user_id=None, username=None, ip_address='', user_agent='', request_path='',
+            request_method='GET', status_code=200, ip_location=''):
+        """记录一次访问，返回False表示队列已满、记录被丢弃"""
+        access_time = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        record = (user_id, username, ip_address, user_agent, request_path,
+                  request_method, status_code, access_time, ip_location)
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+                dropped = self.dropped
+            if dropped % 1000 == 1:
+                logger.warning(f"访问日志队列已满，已丢弃 {dropped} 条记录")
+            return False
+
+    def _loop(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+        # 退出前写完队列中剩余的记录
+        while True:
+            batch = self._drain()
+            if not batch:
+                break
+            self._flush(batch)
+
+    def _collect(self):
+        # 等待第一条记录，之后在flush_interval内尽量攒满一批
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        try:
+            self.db.add_access_logs(batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"批量写入访问日志失败（{len(batch)} 条）: {str(e)}")
+        self.flushes += 1
+
+    def close(self, timeout=5):
+        """停止后台线程并写完剩余记录（进程退出时自动调用）"""
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'queue_size': self._queue.maxsize,
+            'batch_size': self.batch_size,
+            'flush_interval': self.flush_interval,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'flushes': self.flushes
+        }
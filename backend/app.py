@@ -1,11 +1,14 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, verify_jwt_in_request
 import sys
 import logging
 import os
 import json
 import hashlib
+import time
+import base64
+import datetime
 
 # 配置日志 - 同时输出到控制台和文件
 import logging.handlers
@@ -62,56 +65,109 @@ jwt = JWTManager(app)
 # 导入数据库
 from database import db
 
-# 添加访问日志中间件
-@app.before_request
-def log_request():
+# 访问日志在后台线程中批量写入，不在请求线程中提交事务
+from access_log import AccessLogWriter
+access_log_writer = AccessLogWriter(db)
+
+# 用户名和校区缓存，修改校区后需调用user_cache.invalidate
+from user_cache import UserCache
+user_cache = UserCache(db)
+
+def current_user():
+    """返回当前请求的已登录用户 {'id', 'username', 'campus'}，未登录时返回None
+
+    每个请求只解析一次，访问日志中间件和各接口共用同一结果。
+    """
+    if 'current_user' not in g:
+        user = None
+        if request.headers.get('Authorization'):
+            try:
+                verify_jwt_in_request(optional=True)
+                identity = get_jwt_identity()
+                if identity:
+                    user = user_cache.get(identity)
+            except Exception as e:
+                logger.warning(f'获取用户身份失败: {str(e)}')
+        g.current_user = user
+    return g.current_user
+
+def write_access_log(status_code):
+    """将本次请求放入访问日志队列，每个请求只记录一次"""
+    if g.get('access_logged'):
+        return
+    g.access_logged = True
     try:
         # 排除不需要记录的路径
         if request.path.startswith('/static/') or request.path == '/favicon.ico':
             return
             
         # 获取用户信息（如果已登录）
-        user_id = None
-        username = None
-        if request.headers.get('Authorization'):
-            try:
-                current_user = get_jwt_identity()
-                if current_user:
-                    user_id = int(current_user)
-                    user = db.get_user_by_id(user_id)
-                    if user:
-                        username = user[1]
-            except Exception as e:
-                logger.warning(f'获取用户身份失败: {str(e)}')
+        user = current_user()
+        user_id = user['id'] if user else None
+        username = user['username'] if user else None
         
         # 获取IP地址
         ip_address = request.headers.get('X-Forwarded-For', request.remote_addr)
         if ',' in ip_address:
             ip_address = ip_address.split(',')[0].strip()
         
-        # 添加访问日志
-        db.add_access_log(
+        # 添加访问日志（放入队列，由后台线程批量写入）
+        access_log_writer.log(
             user_id=user_id,
             username=username,
             ip_address=ip_address,
             user_agent=request.headers.get('User-Agent', ''),
             request_path=request.path,
-            request_method=request.method
+            request_method=request.method,
+            status_code=status_code
         )
     except Exception as e:
         logger.error(f'记录访问日志失败: {str(e)}')
 
+# 添加访问日志中间件：响应生成后记录，状态码取自实际响应
+@app.after_request
+def log_request(response):
+    write_access_log(response.status_code)
+    return response
+
+@app.teardown_request
+def log_failed_request(error):
+    # 未处理的异常（如调试模式下直接抛出）不经过after_request，按500记录
+    if error is not None:
+        write_access_log(500)
+
 # 添加异常处理（暂时注释掉，测试是否是异常处理导致问题）
 # @app.errorhandler(Exception)
 # def handle_exception(e):
 #     logger.error(f'未捕获的异常: {str(e)}')
 #     return jsonify({'error': '服务器内部错误'}), 500
 
-# 导入南京大学图书馆OPAC爬虫模块
-from opac_spider import spider
+# 创建南京大学图书馆OPAC爬虫（OPAC_SPIDER_ENGINE=async 时使用基于asyncio的引擎）
+from opac_spider import get_spider, SEARCH_DEADLINE
+spider = get_spider()
 
 logger.info('南京大学图书馆OPAC爬虫初始化完成')
 
+# 本地书目镜像：记录爬虫抓取到的图书，供 /api/search?source=local 检索
+from concurrent.futures import ThreadPoolExecutor
+from catalog import LocalCatalog
+from query_normalizer import QueryNormalizer, normalize_query
+catalog = LocalCatalog(db)
+spider.catalog_sink = catalog
+# OPAC_LOCAL_CATALOG_FIRST=1 时搜索默认优先使用本地书目
+LOCAL_CATALOG_FIRST = os.environ.get('OPAC_LOCAL_CATALOG_FIRST', '0') == '1'
+# 本地命中后在后台刷新本地书目的线程池
+catalog_refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix='catalog-refresh')
+
+# 搜索词规范化：规范化后的搜索词用于搜索历史去重，并统计对命中率的提升
+query_normalizer = QueryNormalizer()
+
+# 根据搜索历史在后台预热热门搜索的缓存
+from warmup import CacheWarmer, WARMUP_ENABLED
+warmer = CacheWarmer(spider, db)
+if WARMUP_ENABLED:
+    warmer.start()
+
 # 密码加密函数
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
@@ -218,6 +274,7 @@ def set_campus():
             
         # 更新用户校区
         db.update_user_campus(user_id, campus)
+        user_cache.invalidate(user_id)
         
         return jsonify({'message': '校区设置成功', 'campus': campus})
         
@@ -227,18 +284,78 @@ def set_campus():
 
 # 移除重复的路由定义
 
+def resolve_user_campus():
+    """获取当前已登录用户的有效校区设置，未登录、未设置或无效时返回None"""
+    user = current_user()
+    if not user or not user['campus']:
+        return None
+    # 去除校区字符串中的空格
+    user_campus = user['campus'].replace(' ', '')
+    valid_campuses = ['鼓楼', '仙林', '浦口', '苏州']
+    # 确保是有效的校区名称
+    if user_campus in valid_campuses:
+        return user_campus
+    return None
+
+def sort_holdings_by_campus(holdings, user_campus):
+    """对馆藏信息进行排序，用户所在校区的馆藏优先显示"""
+    if user_campus and holdings:
+        holdings.sort(key=lambda x: 0 if user_campus in x['location'] else 1)
+    return holdings
+
+def filter_book_by_location(book, location):
+    """只保留包含指定馆藏地的馆藏，没有符合条件的馆藏时返回None"""
+    if not book.get('holdings'):
+        return None
+    filtered_holdings = [holding for holding in book['holdings'] 
+                        if holding.get('location') and location in holding['location']]
+    if not filtered_holdings:
+        return None
+    # 如果有符合条件的馆藏，保留这本书并只显示符合条件的馆藏
+    filtered_book = book.copy()
+    filtered_book['holdings'] = filtered_holdings
+    return filtered_book
+
+def arrange_books(books, user_campus, location):
+    """按用户所在校区排序每本书的馆藏，指定馆藏地时只保留有该馆藏地的图书"""
+    if user_campus:
+        for book in books:
+            if book.get('holdings'):
+                sort_holdings_by_campus(book['holdings'], user_campus)
+    if location:
+        books = [book for book in (filter_book_by_location(book, location) for book in books) if book]
+        logger.info(f"馆藏地筛选完成，保留图书数量: {len(books)}")
+    return books
+
+def request_deadline():
+    """计算本次请求的截止时间，可通过参数timeout（秒）缩短，但不超过OPAC_SEARCH_DEADLINE"""
+    budget = SEARCH_DEADLINE
+    timeout = request.args.get('timeout', type=float)
+    if timeout is not None and timeout > 0:
+        budget = min(budget, timeout)
+    return time.monotonic() + budget
+
+def set_data_age_header(response, ages):
+    """将最旧数据的秒数写入X-Data-Age响应头，没有缓存数据时不设置"""
+    ages = list(ages)
+    if ages:
+        response.headers['X-Data-Age'] = str(max(ages))
+    return response
+
 @app.route('/api/search', methods=['GET'])
 @jwt_required(optional=True)  # 使用optional=True允许未登录用户访问
 def search_books():
+    # 整个请求（搜索页和所有详情页）共用一个截止时间，到期未获取到的馆藏标记为holdingsPending
+    deadline = request_deadline()
     try:
         # 获取当前用户信息（如果已登录）
         user_id = get_jwt_identity()
         username = None
         if user_id:
-            # 如果已登录，从数据库获取用户名
-            user = db.get_user_by_id(int(user_id))
+            # 如果已登录，用户名取自本次请求的用户信息（已缓存）
+            user = current_user()
             if user:
-                username = user[1]
+                username = user['username']
             logger.info(f"已登录用户: user_id={user_id}, username={username}")
         else:
             logger.info("未登录用户访问")
@@ -246,60 +363,204 @@ def search_books():
         # 获取查询参数
         query = request.args.get('query', '')
         location = request.args.get('location', '')  # 获取馆藏地筛选参数
+        # holdings=lazy时只返回书目信息，馆藏信息由前端通过 /api/holdings 获取
+        lazy_holdings = request.args.get('holdings', '') == 'lazy'
         logger.info(f"收到搜索请求: query={query}, location={location}, user_id={user_id}")
         
         if not query:
             logger.warning("搜索关键词为空")
             return jsonify({'error': '请输入搜索关键词'}), 400
         
+        # 规范化后的搜索词用于搜索历史去重，发往图书馆的仍是原始搜索词
+        query_key = query_normalizer.normalize(query)
+        
+        if lazy_holdings and location:
+            # 馆藏地筛选依赖馆藏信息，无法延迟获取
+            logger.info("指定了馆藏地筛选，忽略holdings=lazy")
+            lazy_holdings = False
+        
+        # source=local时优先从本地书目镜像返回结果，馆藏状态由前端通过 /api/holdings 获取
+        source = request.args.get('source', 'local' if LOCAL_CATALOG_FIRST else 'upstream')
+        books = None
+        if source == 'local' and not location:
+            # 本地书目保存的是原始书名，只做NFKC和大小写折叠，不做繁简转换
+            books = catalog.search(normalize_query(query, fold_variants=False))
+            if books:
+                logger.info(f"本地书目命中: {query}，返回图书数量: {len(books)}")
+                # 后台向上游刷新本地书目，不阻塞本次请求
+                catalog_refresher.submit(spider.search_books_by_title, query, with_holdings=False)
+        data_source = 'local' if books else 'upstream'
+        
         # 使用爬虫搜索图书
-        books = spider.search_books_by_title(query)
+        if not books:
+            books = spider.search_books_by_title(query, with_holdings=not lazy_holdings, deadline=deadline)
         
-        # 如果用户已登录，获取用户校区设置并优先显示该校区的馆藏
-        if user_id:
-            user = db.get_user_by_id(int(user_id))
-            if user:
-                user_campus = user[3]
-                # 如果用户设置了校区，优先显示该校区的馆藏
-                if user_campus:
-                    # 去除校区字符串中的空格
-                    user_campus = user_campus.replace(' ', '')
-                    valid_campuses = ['鼓楼', '仙林', '浦口', '苏州']
-                    # 确保是有效的校区名称
-                    if user_campus in valid_campuses:
-                        for book in books:
-                            if book.get('holdings'):
-                                # 对馆藏信息进行排序，用户所在校区的馆藏优先显示
-                                book['holdings'].sort(key=lambda x: 0 if user_campus in x['location'] else 1)
-                                logger.info(f"为图书 '{book['title']}' 排序馆藏，优先显示 {user_campus} 校区的馆藏")
+        # 如果用户已登录，记录搜索历史；refresh=1为前端在本地结果之后补充请求上游结果，不重复记录
+        if user_id and request.args.get('refresh') != '1':
+            db.add_search_history(int(user_id), query, location, query_key)
         
-        # 如果用户已登录，记录搜索历史
-        if user_id:
-            db.add_search_history(int(user_id), query, location)
-        
-        # 根据馆藏地筛选图书
-        if location:
-            filtered_books = []
-            for book in books:
-                if book.get('holdings'):
-                    # 筛选出包含指定馆藏地的图书
-                    filtered_holdings = [holding for holding in book['holdings'] 
-                                        if holding.get('location') and location in holding['location']]
-                    if filtered_holdings:
-                        # 如果有符合条件的馆藏，保留这本书并只显示符合条件的馆藏
-                        filtered_book = book.copy()
-                        filtered_book['holdings'] = filtered_holdings
-                        filtered_books.append(filtered_book)
-            books = filtered_books
-            logger.info(f"馆藏地筛选完成，返回图书数量: {len(books)}")
+        # 优先显示用户所在校区的馆藏，并根据馆藏地筛选图书
+        books = arrange_books(books, resolve_user_campus(), location)
         
         logger.info(f"搜索完成，返回图书数量: {len(books)}")
-        return jsonify(books)
+        response = jsonify(books)
+        response.headers['X-Data-Source'] = data_source
+        set_data_age_header(response, [book['dataAge'] for book in books if 'dataAge' in book])
+        return response
         
     except Exception as e:
         logger.error(f"搜索过程中出错: {str(e)}", exc_info=True)
         return jsonify({'error': f'服务器内部错误: {str(e)}'}), 500
 
+@app.route('/api/search/stream', methods=['GET'])
+@jwt_required(optional=True)
+def search_books_stream():
+    """流式搜索：每本书的馆藏信息获取完成后立即以NDJSON格式输出一行"""
+    deadline = request_deadline()
+    try:
+        user_id = get_jwt_identity()
+        query = request.args.get('query', '')
+        location = request.args.get('location', '')
+        logger.info(f"收到流式搜索请求: query={query}, location={location}, user_id={user_id}")
+        
+        if not query:
+            logger.warning("搜索关键词为空")
+            return jsonify({'error': '请输入搜索关键词'}), 400
+        
+        user_campus = resolve_user_campus()
+        
+        # 如果用户已登录，记录搜索历史
+        if user_id:
+            db.add_search_history(int(user_id), query, location, query_normalizer.normalize(query))
+    except Exception as e:
+        logger.error(f"搜索过程中出错: {str(e)}", exc_info=True)
+        return jsonify({'error': f'服务器内部错误: {str(e)}'}), 500
+    
+    def generate():
+        count = 0
+        books = spider.iter_books_by_title(query, deadline=deadline)
+        try:
+            for index, book in books:
+                # 逐本排序馆藏并按馆藏地筛选
+                sort_holdings_by_campus(book.get('holdings'), user_campus)
+                if location:
+                    book = filter_book_by_location(book, location)
+                    if not book:
+                        continue
+                book['index'] = index
+                count += 1
+                yield json.dumps(book, ensure_ascii=False) + '\n'
+            logger.info(f"流式搜索完成，返回图书数量: {count}")
+        except Exception as e:
+            logger.error(f"流式搜索过程中出错: {str(e)}", exc_info=True)
+            yield json.dumps({'error': f'服务器内部错误: {str(e)}'}, ensure_ascii=False) + '\n'
+        finally:
+            # 客户端断开时关闭生成器，取消尚未开始的详情请求
+            books.close()
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# 单次批量搜索的书名数量上限（去重后）
+MAX_SEARCH_BATCH = 30
+
+@app.route('/api/search/batch', methods=['POST'])
+@jwt_required(optional=True)
+def search_books_batch():
+    """批量搜索（如整份书单），每个书名的结果与 /api/search 相同"""
+    deadline = request_deadline()
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        queries = data.get('queries')
+        location = data.get('location') or ''
+        # 馆藏地筛选依赖馆藏信息，指定location时忽略holdings=lazy
+        lazy_holdings = data.get('holdings') == 'lazy' and not location
+        
+        if not isinstance(queries, list) or not queries:
+            return jsonify({'error': 'queries必须是非空列表'}), 400
+        
+        # 规范化后相同的书名只搜索一次，保留第一次出现的写法
+        unique_queries = {}
+        for query in queries:
+            if isinstance(query, str) and query.strip():
+                unique_queries.setdefault(query_normalizer.normalize(query), query.strip())
+        if not unique_queries:
+            return jsonify({'error': '请输入搜索关键词'}), 400
+        if len(unique_queries) > MAX_SEARCH_BATCH:
+            return jsonify({'error': f'单次最多搜索 {MAX_SEARCH_BATCH} 个书名'}), 400
+        logger.info(f"收到批量搜索请求: {len(queries)} 个书名，去重后 {len(unique_queries)} 个, user_id={user_id}")
+        
+        book_lists = spider.search_books_batch(
+            list(unique_queries.values()), with_holdings=not lazy_holdings, deadline=deadline
+        )
+        
+        user_campus = resolve_user_campus()
+        results = []
+        ages = []
+        for (query_key, query), books in zip(unique_queries.items(), book_lists):
+            if user_id:
+                db.add_search_history(int(user_id), query, location, query_key)
+            if books is None:
+                # 到达截止时间仍未得到结果，前端可稍后重试该书名
+                results.append({'query': query, 'books': [], 'pending': True})
+                continue
+            books = arrange_books(books, user_campus, location)
+            ages.extend(book['dataAge'] for book in books if 'dataAge' in book)
+            results.append({'query': query, 'books': books})
+        
+        response = jsonify({'results': results})
+        set_data_age_header(response, ages)
+        return response
+        
+    except Exception as e:
+        logger.error(f"批量搜索过程中出错: {str(e)}", exc_info=True)
+        return jsonify({'error': f'服务器内部错误: {str(e)}'}), 500
+
+# 单次批量获取馆藏信息的recordId数量上限
+MAX_HOLDINGS_BATCH = 50
+
+@app.route('/api/holdings', methods=['POST'])
+@jwt_required(optional=True)
+def get_holdings():
+    """批量获取馆藏信息，配合 /api/search?holdings=lazy 使用"""
+    deadline = request_deadline()
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        record_ids = data.get('recordIds')
+        
+        if not isinstance(record_ids, list) or not record_ids:
+            return jsonify({'error': 'recordIds必须是非空列表'}), 400
+        if len(record_ids) > MAX_HOLDINGS_BATCH:
+            return jsonify({'error': f'单次最多获取 {MAX_HOLDINGS_BATCH} 本图书的馆藏信息'}), 400
+        
+        record_ids = [str(record_id) for record_id in record_ids if record_id]
+        logger.info(f"收到批量馆藏请求: {len(record_ids)} 个recordId, user_id={user_id}")
+        
+        holdings = spider.get_holdings_batch(record_ids, deadline=deadline)
+        # 到达截止时间仍未获取到的recordId，前端可稍后重试
+        pending = [record_id for record_id in dict.fromkeys(record_ids) if record_id not in holdings]
+        
+        # 用户所在校区的馆藏优先显示
+        user_campus = resolve_user_campus()
+        for record_holdings in holdings.values():
+            sort_holdings_by_campus(record_holdings, user_campus)
+        
+        # 各本书馆藏信息已缓存的秒数，前端据此显示更新时间
+        ages = {}
+        for record_id in holdings:
+            age = spider.holdings_age(record_id)
+            if age is not None:
+                ages[record_id] = int(age)
+        
+        response = jsonify({'holdings': holdings, 'ages': ages, 'pending': pending})
+        set_data_age_header(response, ages.values())
+        return response
+        
+    except Exception as e:
+        logger.error(f"批量获取馆藏信息出错: {str(e)}", exc_info=True)
+        return jsonify({'error': f'服务器内部错误: {str(e)}'}), 500
+
 @app.route('/', methods=['GET'])
 def index():
     return jsonify({'message': '南京大学图书馆检索API服务'})
@@ -323,6 +584,7 @@ def set_campus_new():
         
         # 更新用户校区设置
         db.update_user_campus(user_id, campus)
+        user_cache.invalidate(user_id)
         logger.info(f"更新用户校区设置: user_id={user_id}, campus={campus}")
         return jsonify({'message': '校区设置已更新', 'campus': campus})
     except Exception as e:
@@ -387,10 +649,9 @@ def clear_search_history():
 def get_user_campus():
     """获取用户校区设置"""
     try:
-        user_id = get_jwt_identity()
-        user = db.get_user_by_id(int(user_id))
+        user = current_user()
         if user:
-            return jsonify({'campus': user[3]})
+            return jsonify({'campus': user['campus']})
         return jsonify({'campus': None}), 404
     except Exception as e:
         logger.error(f"获取用户校区失败: {str(e)}")
@@ -428,6 +689,26 @@ def get_statistics():
         logger.error(f"获取统计信息失败: {str(e)}")
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/admin/spider-stats', methods=['GET'])
+@jwt_required()
+def get_spider_stats():
+    try:
+        if not is_admin():
+            return jsonify({'error': '无管理员权限'}), 403
+            
+        # 获取爬虫缓存命中率等运行统计
+        return jsonify({
+            'spider': spider.stats(),
+            'warmer': warmer.stats(),
+            'query_normalizer': query_normalizer.stats(),
+            'access_log': access_log_writer.stats(),
+            'user_cache': user_cache.stats(),
+            'database': db.pool.stats()
+        })
+    except Exception as e:
+        logger.error(f"获取爬虫统计信息失败: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+
 @app.route('/api/admin/users', methods=['GET'])
 @jwt_required()
 def get_all_users():
@@ -443,6 +724,59 @@ def get_all_users():
         logger.error(f"获取所有用户信息失败: {str(e)}")
         return jsonify({'error': str(e)}), 400
 
+# 访问日志每页最多返回的条数
+MAX_ACCESS_LOG_PAGE = 1000
+
+def encode_log_cursor(log):
+    """将一页最后一条日志的 (access_time, id) 编码为下一页的游标"""
+    raw = json.dumps([log['access_time'], log['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_log_cursor(cursor):
+    try:
+        access_time, log_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return str(access_time), int(log_id)
+    except Exception:
+        raise ValueError('无效的分页游标')
+
+def parse_log_time(value, end_of_day=False):
+    """将时间参数转换为与access_time相同的格式（UTC），只给出日期时表示当天开始或结束"""
+    if not value:
+        return None
+    value = value.strip().replace('T', ' ').rstrip('Z')
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            parsed = datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt == '%Y-%m-%d' and end_of_day:
+            parsed = parsed.replace(hour=23, minute=59, second=59)
+        return parsed.strftime('%Y-%m-%d %H:%M:%S')
+    raise ValueError(f'无效的时间格式: {value}')
+
+def access_log_page(fetch, default_limit, **filters):
+    """按请求参数筛选并分页获取访问日志，返回响应数据
+    
+    参数：limit、cursor（上一页返回的next_cursor）、path（路径前缀）、status、ip、
+    since/until（UTC时间，YYYY-MM-DD或YYYY-MM-DD HH:MM:SS）。多取一条判断是否还有下一页。
+    """
+    limit = max(1, min(request.args.get('limit', default_limit, type=int), MAX_ACCESS_LOG_PAGE))
+    cursor = request.args.get('cursor')
+    filters.update(
+        path=request.args.get('path') or None,
+        status_code=request.args.get('status', type=int),
+        ip_address=request.args.get('ip') or None,
+        since=parse_log_time(request.args.get('since')),
+        until=parse_log_time(request.args.get('until'), end_of_day=True),
+        before=decode_log_cursor(cursor) if cursor else None
+    )
+    logs = fetch(limit=limit + 1, **filters)
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = encode_log_cursor(logs[-1])
+    return {'logs': logs, 'next_cursor': next_cursor}
+
 @app.route('/api/admin/access-logs', methods=['GET'])
 @jwt_required()
 def get_all_access_logs():
@@ -450,13 +784,10 @@ def get_all_access_logs():
         if not is_admin():
             return jsonify({'error': '无管理员权限'}), 403
             
-        # 获取查询参数
-        limit = request.args.get('limit', 1000, type=int)
-        
-        # 获取所有访问日志
-        logs = db.get_all_access_logs(limit)
+        # 获取所有访问日志（可通过user_id参数只看某个用户）
+        page = access_log_page(db.get_all_access_logs, 1000, user_id=request.args.get('user_id', type=int))
         
-        return jsonify({'logs': logs})
+        return jsonify(page)
     except Exception as e:
         logger.error(f"获取所有访问日志失败: {str(e)}")
         return jsonify({'error': str(e)}), 400
@@ -468,13 +799,10 @@ def get_user_access_logs(user_id):
         if not is_admin():
             return jsonify({'error': '无管理员权限'}), 403
             
-        # 获取查询参数
-        limit = request.args.get('limit', 100, type=int)
-        
         # 获取指定用户的访问日志
-        logs = db.get_user_access_logs(user_id, limit)
+        page = access_log_page(lambda **filters: db.get_user_access_logs(user_id, **filters), 100)
         
-        return jsonify({'logs': logs})
+        return jsonify(page)
     except Exception as e:
         logger.error(f"获取用户访问日志失败: {str(e)}")
         return jsonify({'error': str(e)}), 400
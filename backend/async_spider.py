@@ -0,0 +1,344 @@
+import asyncio
+import concurrent.futures
+import copy
+import logging
+import os
+import random
+import threading
+
+import aiohttp
+import requests
+
+from circuit_breaker import CircuitOpenError
+from opac_spider import (
+    OPACSpider, DeadlineExceeded, time_left, SEARCH_URL, DETAIL_URL, UPSTREAM_POOL_SIZE,
+    UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT, UPSTREAM_RETRIES, UPSTREAM_BACKOFF,
+    UPSTREAM_BACKOFF_JITTER
+)
+
+logger = logging.getLogger('OPACSpider')
+
+# 同时发往图书馆服务器的请求数上限（所有搜索和详情请求共享）
+ASYNC_CONCURRENCY = int(os.environ.get('OPAC_ASYNC_CONCURRENCY', '20'))
+
+
+class UpstreamResponse:
+    """上游响应，提供与requests.Response相同的status_code和text属性"""
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+
+class AsyncOPACClient:
+    """基于asyncio和aiohttp的图书馆OPAC客户端
+
+    与OPACSpider共享缓存、熔断器、限流器、解析方法和页面采样，所有请求复用同一个连接池，
+    并由信号量限制同时进行的上游请求数。相同的并发请求只向上游发起一次。
+    各方法的deadline为截止时间（time.monotonic()的值），到期时尚未获取到的馆藏标记holdingsPending。
+    所有协程都必须在同一个事件循环中运行。
+    """
+
+    def __init__(self, spider, concurrency=ASYNC_CONCURRENCY):
+        self.spider = spider
+        self.concurrency = concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._session = None
+        self._inflight = {}
+        self.coalesced = 0
+
+    async def _get_session(self):
+        # ClientSession必须在事件循环中创建
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=UPSTREAM_POOL_SIZE, ssl=False),
+                headers=self.spider.headers,
+                timeout=aiohttp.ClientTimeout(
+                    total=None,
+                    connect=UPSTREAM_CONNECT_TIMEOUT,
+                    sock_read=UPSTREAM_READ_TIMEOUT
+                )
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def fetch(self, url, params, endpoint, deadline=None):
+        """发送GET请求，经过熔断器和限流器；连接错误和5xx响应按退避时间重试
+
+        deadline为截止时间（time.monotonic()），排队、重试退避和请求超时都不超过剩余时间，
+        到期时抛出DeadlineExceeded，不计入熔断。
+        """
+        breaker = self.spider.breaker
+        if not breaker.allow_request():
+            raise CircuitOpenError('图书馆服务器暂时不可用（熔断中）')
+        # allow_request之后的任何await被取消（调用方到达截止时间）都要归还半开状态的探测名额，不计入熔断
+        try:
+            # 在事件循环中等待请求配额，不占用线程
+            try:
+                await self.spider.limiter.acquire_async(self.spider._limiter_endpoint(endpoint),
+                                                         timeout=time_left(deadline))
+                await asyncio.wait_for(self._semaphore.acquire(), time_left(deadline))
+            except (TimeoutError, asyncio.TimeoutError) as e:
+                breaker.record_cancelled()
+                raise DeadlineExceeded(f'等待上游请求名额到达截止时间: {endpoint}') from e
+            try:
+                session = await self._get_session()
+                for attempt in range(UPSTREAM_RETRIES + 1):
+                    retry_later = attempt < UPSTREAM_RETRIES
+                    try:
+                        async with session.get(url, params=params, **self._request_timeout(deadline)) as response:
+                            text = await response.text()
+                            status = response.status
+                            request_info, history = response.request_info, response.history
+                    except aiohttp.ClientConnectorError:
+                        # 只重试建立连接失败，读取超时不重试
+                        if retry_later and time_left(deadline) != 0:
+                            await self._sleep_backoff(attempt, deadline)
+                            continue
+                        breaker.record_failure()
+                        raise
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        if isinstance(e, asyncio.TimeoutError) and time_left(deadline) == 0:
+                            # 因截止时间缩短了超时，无法判断上游是否异常，不计入熔断
+                            breaker.record_cancelled()
+                            raise DeadlineExceeded(f'上游请求到达截止时间: {endpoint}') from e
+                        breaker.record_failure()
+                        raise
+                    if status >= 500 and retry_later and time_left(deadline) != 0:
+                        await self._sleep_backoff(attempt, deadline)
+                        continue
+                    break
+            finally:
+                self._semaphore.release()
+        except asyncio.CancelledError:
+            breaker.record_cancelled()
+            raise
+
+        if status >= 500:
+            breaker.record_failure()
+        else:
+            # 4xx说明服务器可用，不计入熔断
+            breaker.record_success()
+        if status >= 400:
+            raise aiohttp.ClientResponseError(request_info, history, status=status, message=f'HTTP {status}')
+        return UpstreamResponse(status, text)
+
+    def _request_timeout(self, deadline):
+        # 未指定截止时间时使用会话的默认超时；传入timeout=None会关闭所有超时，因此不传该参数
+        remaining = time_left(deadline)
+        if remaining is None:
+            return {}
+        return {'timeout': aiohttp.ClientTimeout(
+            total=remaining,
+            connect=min(UPSTREAM_CONNECT_TIMEOUT, remaining),
+            sock_read=min(UPSTREAM_READ_TIMEOUT, remaining)
+        )}
+
+    async def _sleep_backoff(self, attempt, deadline):
+        delay = self._backoff(attempt)
+        remaining = time_left(deadline)
+        await asyncio.sleep(delay if remaining is None else min(delay, remaining))
+
+    def _backoff(self, attempt):
+        return UPSTREAM_BACKOFF * (2 ** attempt) + random.uniform(0, UPSTREAM_BACKOFF_JITTER)
+
+    async def _coalesce(self, key, factory):
+        """相同key的并发调用共享同一个任务，每个调用方得到结果的副本"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield避免某个调用方被取消时连带取消共享的任务
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result)
+
+    async def search_books_by_title(self, title, page=1, max_results=10, with_holdings=True, deadline=None):
+        """根据书名搜索图书，参数和返回值与OPACSpider.search_books_by_title相同"""
+        spider = self.spider
+        cache_key = (spider._normalize_title(title), page, max_results)
+        entry = spider._get_cached_bib(cache_key, title, page, max_results)
+        if entry is not None:
+            logger.info(f"搜索结果命中缓存: {title}")
+        else:
+            books = await self._coalesce(cache_key, lambda: self._search_bib(cache_key, title, page, max_results, deadline))
+            entry = (books, 0) if books else spider._get_stale_bib(cache_key, title)
+        if entry is None:
+            return spider._fallback_books(title, max_results, deadline)
+        books, age = entry
+
+        # 搜索缓存只保存书目信息，馆藏每次都经馆藏缓存获取
+        if with_holdings:
+            holdings_map = await self.get_holdings_batch([book.get('recordId') for book in books], deadline=deadline)
+            for book in books:
+                record_id = book.get('recordId')
+                if record_id in holdings_map:
+                    book['holdings'] = [dict(holding) for holding in holdings_map[record_id]]
+                elif record_id:
+                    book['holdingsPending'] = True
+        else:
+            for book in books:
+                if book.get('recordId'):
+                    book['holdingsPending'] = True
+        return spider._with_age(books, age)
+
+    async def _search_bib(self, cache_key, title, page, max_results, deadline=None):
+        """请求搜索页并缓存书目信息（不含馆藏），失败时返回空列表"""
+        spider = self.spider
+        books = spider.search_cache.get(cache_key)
+        if books is not None:
+            return books
+        try:
+            search_params = spider._search_params(title, page, max_results)
+            logger.info(f"发送异步搜索请求到: {SEARCH_URL}，参数: {search_params}")
+            response = await self.fetch(SEARCH_URL, search_params, 'search', deadline)
+            books = spider._parse_books(response.text, title, max_results)
+            spider.capture.capture('search', search_params, response.text, books)
+        except CircuitOpenError as e:
+            logger.warning(f"跳过搜索请求: {str(e)}")
+            return []
+        except DeadlineExceeded as e:
+            logger.warning(f"搜索请求到达截止时间: {str(e)}")
+            return []
+        except Exception as e:
+            logger.error(f"异步搜索过程中出错: {str(e)}")
+            return []
+        if books:
+            spider.search_cache.set(cache_key, books)
+            spider._record_books(books)
+        return books
+
+    async def get_book_details(self, record_id, allow_stale=True, deadline=None):
+        """获取图书的详细馆藏信息，参数和返回值与OPACSpider.get_book_details相同"""
+        spider = self.spider
+        entry = spider.holdings_cache.get_with_age(record_id)
+        if entry is not None:
+            holdings, age = entry
+            if age <= spider.holdings_cache.status_ttl:
+                return holdings
+            if allow_stale:
+                # 后台刷新在线程池中执行，不阻塞事件循环
+                spider._revalidate(('detail', record_id), spider._refresh_details, record_id)
+                return holdings
+
+        holdings = await self._coalesce(('detail', record_id), lambda: self._fetch_and_cache_details(record_id, deadline))
+        if holdings is not None:
+            return holdings
+        if time_left(deadline) == 0:
+            raise DeadlineExceeded(f'获取馆藏信息到达截止时间，record_id: {record_id}')
+
+        # 抓取失败时，使用缓存中的索书号和馆藏地，借阅状态标记为未知
+        holdings = spider.holdings_cache.get_static(record_id)
+        return holdings if holdings is not None else []
+
+    async def _fetch_and_cache_details(self, record_id, deadline=None):
+        """抓取并解析详情页，写入馆藏缓存，失败时返回None"""
+        spider = self.spider
+        holdings = spider.holdings_cache.get(record_id)
+        if holdings is not None:
+            return holdings
+        try:
+            detail_params = spider._detail_params(record_id)
+            response = await self.fetch(DETAIL_URL, detail_params, 'detail', deadline)
+            holdings = spider._parse_book_details(response.text)
+            spider.capture.capture('detail', detail_params, response.text, holdings)
+        except CircuitOpenError as e:
+            logger.warning(f"跳过详情请求，record_id: {record_id}: {str(e)}")
+            return None
+        except DeadlineExceeded as e:
+            logger.warning(f"详情请求到达截止时间，record_id: {record_id}: {str(e)}")
+            return None
+        except Exception as e:
+            logger.error(f"异步获取图书详情时出错，record_id: {record_id}: {str(e)}")
+            return None
+        spider.holdings_cache.set(record_id, holdings)
+        spider._record_holdings(record_id, holdings)
+        return holdings
+
+    async def get_holdings_batch(self, record_ids, allow_stale=True, deadline=None):
+        """并发获取多本图书的馆藏信息，返回 {recordId: 馆藏列表}
+
+        到达截止时间仍未获取到的recordId不包含在结果中。
+        """
+        unique_ids = list(dict.fromkeys(record_id for record_id in record_ids if record_id))
+        results = await asyncio.gather(
+            *(self.get_book_details(record_id, allow_stale, deadline) for record_id in unique_ids),
+            return_exceptions=True
+        )
+        holdings_map = {}
+        for record_id, result in zip(unique_ids, results):
+            if isinstance(result, DeadlineExceeded):
+                continue
+            if isinstance(result, BaseException):
+                logger.warning(f"获取馆藏信息失败，record_id: {record_id}，错误: {str(result)}")
+                result = []
+            holdings_map[record_id] = result
+        return holdings_map
+
+    def stats(self):
+        return {
+            'concurrency': self.concurrency,
+            'in_flight': len(self._inflight),
+            'coalesced': self.coalesced
+        }
+
+
+class AsyncOPACSpider(OPACSpider):
+    """OPACSpider的同步适配器，所有上游请求都在后台事件循环中由AsyncOPACClient完成
+
+    公开接口与OPACSpider相同，可直接替换；详情页的并发由事件循环和信号量控制，
+    不再占用详情线程池中的线程。
+    """
+
+    def __init__(self, concurrency=ASYNC_CONCURRENCY):
+        super().__init__()
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, name='opac-async', daemon=True)
+        self._loop_thread.start()
+        self.client = AsyncOPACClient(self, concurrency)
+        logger.info(f"异步爬虫引擎初始化完成，并发上限: {concurrency}")
+
+    def run(self, coro, deadline=None):
+        """在后台事件循环中运行协程并等待结果，到达截止时间时取消协程并抛出DeadlineExceeded"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout=time_left(deadline))
+        except concurrent.futures.TimeoutError as e:
+            # Python 3.11起asyncio.TimeoutError与之相同，协程自身超时时future已完成
+            if future.done():
+                raise
+            future.cancel()
+            raise DeadlineExceeded('已到达截止时间') from e
+
+    def _get(self, url, params, endpoint, deadline=None):
+        # 将aiohttp异常转换为requests异常，保持与OPACSpider相同的错误处理
+        if time_left(deadline) == 0:
+            raise DeadlineExceeded(f'已到达截止时间，跳过请求: {endpoint}')
+        try:
+            return self.run(self.client.fetch(url, params, endpoint, deadline), deadline)
+        except aiohttp.ClientResponseError as e:
+            raise requests.exceptions.HTTPError(f'{e.status} {e.message}') from e
+        except asyncio.TimeoutError as e:
+            raise requests.exceptions.Timeout(str(e)) from e
+        except aiohttp.ClientError as e:
+            raise requests.exceptions.ConnectionError(str(e)) from e
+
+    def get_book_details(self, record_id, allow_stale=True, deadline=None):
+        return self.run(self.client.get_book_details(record_id, allow_stale, deadline), deadline)
+
+    def _submit_detail(self, record_id, allow_stale=True, deadline=None):
+        # 返回concurrent.futures.Future，可直接用于as_completed和cancel；
+        # 调用方等待Future时同样受截止时间限制，到期后取消
+        return asyncio.run_coroutine_threadsafe(self.client.get_book_details(record_id, allow_stale, deadline), self._loop)
+
+    def stats(self):
+        stats = super().stats()
+        stats['engine'] = 'async'
+        stats['async_client'] = self.client.stats()
+        return stats
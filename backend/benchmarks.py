@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# 后端性能微基准，使用合成数据，不访问图书馆服务器
+#
+# 用法: python benchmarks.py extract [--rows N] [--padding KB] [--no-marker] [--repeat N]
+#       python benchmarks.py normalize [--db PATH] [--window N]
+#       python benchmarks.py memory [--holdings N] [--per-book N]
+#       python benchmarks.py db-stress [--readers N] [--writers N] [--duration S]
+#       python benchmarks.py deadline-breaker [--requests N] [--deadline S] [--delay S]
+import argparse
+import copy
+import gc
+import http.server
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from opac_spider import OPACSpider, DeadlineExceeded, UPSTREAM_ORIGIN
+from query_normalizer import QueryNormalizer
+from records import encode_books, decode_books
+
+
+def best_of(fn, repeat):
+    """重复执行fn，返回最短的一次耗时（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def make_search_page(rows, padding_kb, marker=True):
+    """构造搜索结果页：内嵌 var data = {...}，前后带有大量无关HTML
+
+    marker为False时省略JSON后的“// 获取数据”注释，旧版正则会退回到更宽松的模式。
+    """
+    book_list = [{
+        'recordId': str(100000 + i),
+        'title': f'Python程序设计 第{i}版',
+        'author': '张三; 李四',
+        'publisher': '高等教育出版社',
+        'year': '2020',
+        # 字符串中包含 }; 时旧的非贪婪正则会截断JSON
+        'summary': '示例摘要 {"a": 1}; 结束'
+    } for i in range(rows)]
+    padding = '<div class="weui-cell">填充内容</div>\n' * (padding_kb * 1024 // 40)
+    payload = json.dumps({'list': book_list, 'total': rows}, ensure_ascii=False)
+    comment = ' \\/\\/ 获取数据' if marker else ''
+    return f'<html><head></head><body>{padding}<script>var data = {payload};{comment}\n</script>{padding}</body></html>'
+
+
+def legacy_regex_extract(html_content):
+    """旧版实现：用非贪婪正则截取JSON后再解析（仅用于对比）"""
+    match = re.search(r'var\s+data\s*=\s*(\{.*?\});\s*\\/\\/\s*获取数据', html_content, re.DOTALL)
+    if not match:
+        match = re.search(r'var\s+data\s*=\s*(\{.*?\});', html_content, re.DOTALL)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except json.JSONDecodeError:
+        return None
+
+
+def bench_extract(args):
+    spider = OPACSpider()
+    html_content = make_search_page(args.rows, args.padding, not args.no_marker)
+    print(f'页面大小: {len(html_content) / 1024:.0f} KB, 图书数: {args.rows}')
+
+    legacy = legacy_regex_extract(html_content)
+    current = spider._extract_embedded_json(html_content)
+    print(f'旧版正则提取: {"成功" if legacy else "失败（JSON被截断）"}, '
+          f'{best_of(lambda: legacy_regex_extract(html_content), args.repeat) * 1000:.2f} ms')
+    print(f'raw_decode提取: {"成功" if current else "失败"}, '
+          f'{best_of(lambda: spider._extract_embedded_json(html_content), args.repeat) * 1000:.2f} ms')
+    print(f'完整书目解析(_parse_books): '
+          f'{best_of(lambda: spider._parse_books(html_content, "", args.rows), args.repeat) * 1000:.2f} ms')
+
+
+# 没有搜索历史时使用的示例搜索序列，包含大小写、全角、多余空白和繁简写法的差异
+SAMPLE_QUERIES = [
+    'Python', 'python ', 'ｐｙｔｈｏｎ', 'PYTHON', '数据结构', '數據結構', '数据  结构',
+    '红楼梦', '紅樓夢', '三体', '三体 ', 'Java', 'java编程思想', 'Java编程思想', '算法导论',
+    '算法導論', 'Linux', 'linux', 'ＬＩＮＵＸ', '红楼梦', '机器学习', '機器學習', '机器学习 '
+]
+
+
+def load_history_queries(db_path):
+    """按时间顺序读取搜索历史中的原始搜索词，数据库不存在时返回空列表
+
+    search_history中同一用户的相同搜索只保留最近一条，得到的命中率低于实际缓存命中率。
+    """
+    try:
+        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    except sqlite3.Error:
+        return []
+    try:
+        rows = conn.execute("SELECT query FROM search_history ORDER BY search_time, id").fetchall()
+    except sqlite3.Error:
+        rows = []
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+
+def bench_normalize(args):
+    queries = load_history_queries(args.db) if args.db else []
+    source = args.db
+    if not queries:
+        queries, source = SAMPLE_QUERIES, '示例搜索序列'
+    normalizer = QueryNormalizer(window=args.window)
+    for query in queries:
+        normalizer.normalize(query)
+    stats = normalizer.stats()
+    print(f'数据来源: {source}, 搜索次数: {stats["queries"]}, 规范化改变的搜索词: {stats["changed"]}')
+    print(f'规范化前命中率: {stats["legacy_hit_rate"]:.2%}')
+    print(f'规范化后命中率: {stats["hit_rate"]:.2%} (提升 {stats["hit_rate_gain"]:.2%})')
+
+
+LOCATIONS = ['仙林理科借阅区', '仙林文科借阅区', '鼓楼理科借阅区', '鼓楼文科借阅区', '苏州校区图书馆', '浦口图书馆']
+STATUSES = ['可借', '借出', '馆内阅览']
+
+
+def fresh(text):
+    """返回内容相同的新字符串对象（模拟解析页面得到的字符串，彼此不共享）"""
+    return ''.join(list(text))
+
+
+def make_books(holdings_count, per_book):
+    """构造与爬虫返回格式相同的图书字典列表，共holdings_count条馆藏"""
+    books = []
+    for i in range(holdings_count // per_book):
+        books.append({
+            'title': fresh(f'示例图书 第{i}册'),
+            'author': fresh(f'作者{i % 5000}'),
+            'publisher': fresh('高等教育出版社'),
+            'year': fresh('2020'),
+            'recordId': fresh(str(100000 + i)),
+            'holdings': [{
+                'callNumber': fresh(f'TP{i}/{j}'),
+                'location': fresh(LOCATIONS[(i + j) % len(LOCATIONS)]),
+                'status': fresh(STATUSES[(i * j) % len(STATUSES)])
+            } for j in range(per_book)]
+        })
+    return books
+
+
+def measure(build):
+    """返回build()的结果在构造完成后仍占用的内存（字节）"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def bench_memory(args):
+    per_book = max(1, args.per_book)
+    count = args.holdings // per_book * per_book
+    print(f'馆藏数: {count}, 图书数: {count // per_book}')
+
+    dict_books, dict_size = measure(lambda: make_books(count, per_book))
+    del dict_books
+    compact_books, compact_size = measure(lambda: encode_books(make_books(count, per_book)))
+    print(f'字典表示: {dict_size / 1024 / 1024:.1f} MB ({dict_size / count:.0f} 字节/条馆藏)')
+    print(f'紧凑表示: {compact_size / 1024 / 1024:.1f} MB ({compact_size / count:.0f} 字节/条馆藏), '
+          f'节省 {1 - compact_size / dict_size:.0%}')
+
+    # 缓存读写原先使用deepcopy复制字典，改为编码/解码
+    books = decode_books(compact_books)
+    print(f'deepcopy耗时: {best_of(lambda: copy.deepcopy(books), args.repeat) * 1000:.1f} ms, '
+          f'编码耗时: {best_of(lambda: encode_books(books), args.repeat) * 1000:.1f} ms, '
+          f'解码耗时: {best_of(lambda: decode_books(compact_books), args.repeat) * 1000:.1f} ms')
+
+
+def percentile(values, q):
+    """返回values的q分位数（q取0到1），values为空时返回0"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def run_stress(db, readers, writers, duration, user_id):
+    """并发执行读写操作duration秒，返回(读耗时列表, 写耗时列表, 错误列表)"""
+    stop = threading.Event()
+    read_times, write_times, errors = [], [], []
+    lock = threading.Lock()
+
+    def reader():
+        reads = [
+            lambda: db.get_search_history(user_id),
+            lambda: db.get_user_by_id(user_id),
+            lambda: db.get_all_access_logs(100),
+            db.get_statistics
+        ]
+        times, i = [], 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                reads[i % len(reads)]()
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+            times.append(time.perf_counter() - start)
+            i += 1
+        with lock:
+            read_times.extend(times)
+
+    def writer(n):
+        times, i = [], 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                if i % 2:
+                    db.add_search_history(user_id, f'压测搜索词 {n}-{i % 50}')
+                else:
+                    access_time = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+                    db.add_access_logs([(user_id, 'stress', '127.0.0.1', 'bench', '/api/search', 'GET', 200,
+                                         access_time, '')] * 50)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+            times.append(time.perf_counter() - start)
+            i += 1
+        with lock:
+            write_times.extend(times)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return read_times, write_times, errors
+
+
+def bench_db_stress(args):
+    # 导入database会创建默认的全局实例，这里另建临时数据库进行压测
+    from database import Database
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'stress.db'))
+        user_id = db.add_user('stress', 'x', '仙林')
+        for i in range(200):
+            db.add_search_history(user_id, f'示例搜索词 {i}')
+
+        print(f'读线程: {args.readers}, 写线程: {args.writers}, 每轮 {args.duration} 秒')
+        for label, writers in (('只读', 0), ('读写并发', args.writers)):
+            read_times, write_times, errors = run_stress(db, args.readers, writers, args.duration, user_id)
+            line = (f'{label}: 读 {len(read_times) / args.duration:.0f} 次/秒, '
+                    f'p50 {percentile(read_times, 0.5) * 1000:.2f} ms, '
+                    f'p99 {percentile(read_times, 0.99) * 1000:.2f} ms')
+            if writers:
+                line += (f'; 写 {len(write_times) / args.duration:.0f} 次/秒, '
+                         f'p99 {percentile(write_times, 0.99) * 1000:.2f} ms')
+            print(f'{line}; 错误 {len(errors)} 次')
+            for error in errors[:3]:
+                print(f'  {type(error).__name__}: {error}')
+        print(f'连接池: {db.pool.stats()}')
+        db.close()
+
+
+def start_slow_server(delay):
+    """在本地启动一个每个请求都延迟delay秒才响应的HTTP服务，返回(服务, 地址)"""
+    class SlowHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            try:
+                body = b'<html><body><div id="tab1"></div></body></html>'
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except OSError:
+                # 客户端已超时断开
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/'
+
+
+def bench_deadline_breaker(args):
+    """截止时间早于上游响应的请求只应抛出DeadlineExceeded，不应使熔断器打开"""
+    server, origin = start_slow_server(args.delay)
+    spider = OPACSpider()
+    # 与图书馆服务器使用同一个连接池配置（含Retry(read=0)），读取超时的异常类型与线上一致
+    spider.session.mount(origin, spider.session.get_adapter(UPSTREAM_ORIGIN))
+    print(f'上游延迟: {args.delay} 秒, 截止时间: {args.deadline} 秒, 请求数: {args.requests}, '
+          f'熔断阈值: {spider.breaker.failure_threshold}')
+    outcomes = {}
+    try:
+        for _ in range(args.requests):
+            try:
+                spider._get(origin, {}, 'detail', time.monotonic() + args.deadline)
+                outcome = '成功'
+            except DeadlineExceeded:
+                outcome = 'DeadlineExceeded'
+            except Exception as e:
+                outcome = type(e).__name__
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    finally:
+        server.shutdown()
+    breaker = spider.breaker.stats()
+    print(f'请求结果: {outcomes}')
+    print(f'熔断器: {breaker["state"]}, 连续失败 {breaker["consecutive_failures"]} 次')
+    if breaker['state'] != 'closed' or breaker['consecutive_failures']:
+        print('错误: 因截止时间中止的请求被计为上游失败')
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='后端性能微基准')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    extract = subparsers.add_parser('extract', help='搜索页内嵌JSON提取')
+    extract.add_argument('--rows', type=int, default=100, help='每页图书数')
+    extract.add_argument('--padding', type=int, default=512, help='JSON前后各填充的HTML大小（KB）')
+    extract.add_argument('--no-marker', action='store_true', help='省略JSON后的“获取数据”注释')
+    extract.add_argument('--repeat', type=int, default=20, help='重复次数（取最快一次）')
+    extract.set_defaults(func=bench_extract)
+
+    normalize = subparsers.add_parser('normalize', help='搜索词规范化前后的命中率')
+    normalize.add_argument('--db', default='library.db', help='读取search_history的数据库，为空时使用示例搜索序列')
+    normalize.add_argument('--window', type=int, default=512, help='记录的最近搜索键数量（近似缓存容量）')
+    normalize.set_defaults(func=bench_normalize)
+
+    memory = subparsers.add_parser('memory', help='缓存中图书和馆藏的内存占用（字典与紧凑记录对比）')
+    memory.add_argument('--holdings', type=int, default=100000, help='馆藏条数')
+    memory.add_argument('--per-book', type=int, default=4, help='每本图书的馆藏条数')
+    memory.add_argument('--repeat', type=int, default=3, help='编解码计时的重复次数（取最快一次）')
+    memory.set_defaults(func=bench_memory)
+
+    db_stress = subparsers.add_parser('db-stress', help='数据库连接池的并发读写压测（使用临时数据库）')
+    db_stress.add_argument('--readers', type=int, default=8, help='读线程数')
+    db_stress.add_argument('--writers', type=int, default=4, help='写线程数')
+    db_stress.add_argument('--duration', type=float, default=3, help='每轮压测的秒数')
+    db_stress.set_defaults(func=bench_db_stress)
+
+    deadline_breaker = subparsers.add_parser('deadline-breaker', help='截止时间中止的慢请求不计入熔断（使用本地慢速服务）')
+    deadline_breaker.add_argument('--requests', type=int, default=10, help='请求数（应超过熔断阈值）')
+    deadline_breaker.add_argument('--deadline', type=float, default=0.2, help='每个请求的截止时间（秒）')
+    deadline_breaker.add_argument('--delay', type=float, default=2, help='本地服务的响应延迟（秒）')
+    deadline_breaker.set_defaults(func=bench_deadline_breaker)
+
+    args = parser.parse_args()
+    # 关闭解析器的逐条日志，避免影响耗时统计
+    logging.getLogger('OPACSpider').setLevel(logging.WARNING)
+    return args.func(args) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
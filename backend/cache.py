@@ -0,0 +1,238 @@
+import copy
+import marshal
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """带过期时间的LRU缓存，线程安全
+
+    超过max_size时淘汰最久未使用的条目，超过ttl秒的条目视为过期（但在被淘汰前仍可通过get_stale读取）。
+    soft_ttl（默认等于ttl）供调用方判断未过期的条目是否需要在后台刷新。
+    读写时都会复制一份数据，避免调用方修改缓存中的对象；指定codec时，
+    写入时用codec.encode转换为紧凑的内部表示，读取时用codec.decode还原（见records.py）。
+    指定store（SharedCacheStore）时条目保存在多进程共享的存储中，以name为命名空间，
+    值经codec.dumps/loads序列化，容量和过期时间对所有进程统一生效；命中统计仍按进程计算。
+    """
+
+    def __init__(self, max_size=256, ttl=300, name='cache', soft_ttl=None, codec=None, store=None):
+        self._encode = codec.encode if codec else copy.deepcopy
+        self._decode = codec.decode if codec else copy.deepcopy
+        self._dumps = codec.dumps if codec else marshal.dumps
+        self._loads = codec.loads if codec else marshal.loads
+        self.store = store
+        self.max_size = max_size
+        self.ttl = ttl
+        self.soft_ttl = ttl if soft_ttl is None else min(soft_ttl, ttl)
+        self.name = name
+        self._data = OrderedDict()  # key -> (写入时间, 值)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """获取缓存值，未命中或已过期时返回None"""
+        entry = self.get_with_age(key)
+        return entry[0] if entry else None
+
+    def get_with_age(self, key):
+        """获取缓存值及其已缓存的秒数，未命中或已过期时返回None"""
+        if self.store is not None:
+            return self._get_shared(key, stale=False)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            age = now - stored_at
+            if age > self.ttl:
+                # 过期条目保留到被LRU淘汰，上游不可用时仍可通过get_stale使用
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return self._decode(value), age
+
+    def get_stale(self, key):
+        """忽略过期时间获取缓存值及其已缓存的秒数，仅在无法获取新数据时使用"""
+        if self.store is not None:
+            return self._get_shared(key, stale=True)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            age = time.monotonic() - stored_at
+        return self._decode(value), age
+
+    def _get_shared(self, key, stale):
+        # 共享存储使用墙上时钟记录写入时间，各进程和重启前后一致
+        entry = self.store.get(self.name, key)
+        if entry is None:
+            if not stale:
+                with self._lock:
+                    self.misses += 1
+            return None
+        stored_at, data = entry
+        age = max(0.0, time.time() - stored_at)
+        if not stale:
+            with self._lock:
+                if age > self.ttl:
+                    self.expirations += 1
+                    self.misses += 1
+                    return None
+                self.hits += 1
+        return self._decode(self._loads(data)), age
+
+    def set(self, key, value):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        value = self._encode(value)
+        if self.store is not None:
+            evicted = self.store.set(self.name, key, self._dumps(value), self.max_size)
+            with self._lock:
+                self.evictions += evicted
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """删除指定条目"""
+        if self.store is not None:
+            self.store.delete(self.name, key)
+            return
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """清空缓存"""
+        if self.store is not None:
+            self.store.clear(self.name)
+            return
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        if self.store is not None:
+            return self.store.count(self.name)
+        return len(self._data)
+
+    def stats(self):
+        """返回缓存统计信息"""
+        size = len(self)
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'shared': self.store is not None,
+                'size': size,
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'soft_ttl': self.soft_ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+class HoldingsCache:
+    """按recordId缓存馆藏信息，索书号/馆藏地与借阅状态使用不同的过期时间
+
+    索书号和馆藏地几乎不变，在static_ttl内都可以使用；借阅状态变化较快，
+    超过status_ttl后需要重新抓取详情页，抓取失败时仍可返回不含状态的馆藏信息。
+    status_stale_ttl（默认等于status_ttl）内的借阅状态仍可通过get_with_age读取，由调用方在后台刷新。
+    """
+
+    UNKNOWN_STATUS = '未知状态'
+
+    def __init__(self, max_size=4096, static_ttl=86400, status_ttl=300, name='holdings', status_stale_ttl=None,
+                 codec=None, store=None):
+        self.status_ttl = status_ttl
+        self.status_stale_ttl = status_ttl if status_stale_ttl is None else max(status_stale_ttl, status_ttl)
+        self._cache = TTLCache(max_size=max_size, ttl=static_ttl, name=name, codec=codec, store=store)
+        # 命中计数在多个线程中更新，与TTLCache一样加锁
+        self._lock = threading.Lock()
+        self.status_hits = 0
+        self.stale_hits = 0
+        self.static_hits = 0
+
+    def get(self, record_id):
+        """返回借阅状态仍然有效的馆藏信息，否则返回None"""
+        entry = self._cache.get_with_age(record_id)
+        if entry is None:
+            return None
+        holdings, age = entry
+        if age > self.status_ttl:
+            return None
+        with self._lock:
+            self.status_hits += 1
+        return holdings
+
+    def get_with_age(self, record_id):
+        """返回status_stale_ttl内的馆藏信息及其已缓存的秒数，否则返回None"""
+        entry = self._cache.get_with_age(record_id)
+        if entry is None:
+            return None
+        holdings, age = entry
+        if age > self.status_stale_ttl:
+            return None
+        with self._lock:
+            if age > self.status_ttl:
+                self.stale_hits += 1
+            else:
+                self.status_hits += 1
+        return holdings, age
+
+    def age(self, record_id):
+        """返回馆藏信息已缓存的秒数，不存在时返回None（不计入命中统计）"""
+        entry = self._cache.get_stale(record_id)
+        return entry[1] if entry else None
+
+    def get_static(self, record_id):
+        """返回仍在static_ttl内的馆藏信息，借阅状态标记为未知；不存在时返回None"""
+        entry = self._cache.get_with_age(record_id)
+        if entry is None:
+            return None
+        holdings, _ = entry
+        with self._lock:
+            self.static_hits += 1
+        for holding in holdings:
+            holding['status'] = self.UNKNOWN_STATUS
+        return holdings
+
+    def set(self, record_id, holdings):
+        """写入刚抓取到的馆藏信息"""
+        self._cache.set(record_id, holdings)
+
+    def delete(self, record_id):
+        self._cache.delete(record_id)
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def stats(self):
+        """返回缓存统计信息"""
+        stats = self._cache.stats()
+        stats['static_ttl'] = stats.pop('ttl')
+        stats.pop('soft_ttl')
+        stats['status_ttl'] = self.status_ttl
+        stats['status_stale_ttl'] = self.status_stale_ttl
+        with self._lock:
+            stats['status_hits'] = self.status_hits
+            stats['stale_hits'] = self.stale_hits
+            stats['static_hits'] = self.static_hits
+        return stats
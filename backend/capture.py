@@ -0,0 +1,141 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+logger = logging.getLogger('OPACSpider')
+
+
+class PageCapture:
+    """按采样率抓取上游页面并异步写入磁盘，用于离线回放测试
+
+    默认关闭（sample_rate为0）。每个页面保存为一个gzip压缩的JSON文件，
+    包含页面类型、请求参数、原始HTML以及当时的解析结果。
+    目录中的文件数和总大小超过上限时删除最旧的文件。
+    写入队列已满时直接丢弃，不阻塞请求线程。
+    """
+
+    def __init__(self, directory='captures', sample_rate=0.0, max_files=200,
+                 max_bytes=50 * 1024 * 1024, queue_size=100):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.captured = 0
+        self.dropped = 0
+        self.errors = 0
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def capture(self, kind, params, html, parsed=None):
+        """按采样率提交一个页面，实际写入在后台线程中完成"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return False
+        record = {
+            'kind': kind,
+            'captured_at': time.time(),
+            'params': params,
+            'html': html,
+            'parsed': parsed
+        }
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _ensure_writer(self):
+        """首次使用时启动后台写入线程"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name='page-capture', daemon=True)
+                self._thread.start()
+                logger.info(f"页面采样已启用，采样率: {self.sample_rate}，目录: {self.directory}")
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            try:
+                self._write(record)
+                self._enforce_quota()
+                self.captured += 1
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"写入采样页面失败: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, record):
+        # 文件名只包含时间戳、页面类型和参数摘要，不直接使用搜索词
+        digest = hashlib.sha1(json.dumps(record['params'], sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:12]
+        filename = f"{time.time_ns()}_{record['kind']}_{digest}.json.gz"
+        path = os.path.join(self.directory, filename)
+        tmp_path = path + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _enforce_quota(self):
+        """删除最旧的文件，直到文件数和总大小都在上限内"""
+        files = sorted(name for name in os.listdir(self.directory) if name.endswith('.json.gz'))
+        sizes = {name: os.path.getsize(os.path.join(self.directory, name)) for name in files}
+        total = sum(sizes.values())
+        while files and (len(files) > self.max_files or total > self.max_bytes):
+            oldest = files.pop(0)
+            total -= sizes[oldest]
+            os.remove(os.path.join(self.directory, oldest))
+
+    def flush(self, timeout=None):
+        """等待队列中的页面写入完成（主要用于测试和退出前），超过timeout秒时返回False"""
+        if self._thread is None:
+            return True
+        # 与Queue.join相同，等待task_done在所有任务完成时发出的通知，但可以指定超时
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'directory': self.directory,
+            'captured': self.captured,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'queued': self._queue.qsize()
+        }
+
+
+def load_captures(directory, kind=None):
+    """按时间顺序读取采样目录中的页面，可按页面类型筛选
+
+    除采样生成的.json.gz外也读取未压缩的.json，便于在仓库中保存手工构造的页面。
+    """
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.endswith('.json.gz'):
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                record = json.load(f)
+        elif name.endswith('.json'):
+            with open(path, encoding='utf-8') as f:
+                record = json.load(f)
+        else:
+            continue
+        if kind and record.get('kind') != kind:
+            continue
+        record['file'] = name
+        yield record
@@ -0,0 +1,60 @@
+import copy
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('OPACSpider')
+
+
+class LocalCatalog:
+    """本地书目镜像：在后台线程中记录爬虫抓取到的图书，并提供本地全文检索
+
+    作为OPACSpider的catalog_sink使用，写入数据库不占用请求线程。
+    本地检索结果只有索书号和馆藏地，借阅状态标记为未知并设置holdingsPending，
+    由调用方再通过爬虫获取实时馆藏。
+    """
+
+    UNKNOWN_STATUS = '未知状态'
+
+    def __init__(self, db):
+        self.db = db
+        # 单线程写入，保证同一本书的更新按顺序执行
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='catalog-writer')
+        self.hits = 0
+        self.misses = 0
+
+    def add_books(self, books):
+        """记录搜索到的图书（异步写入）"""
+        self._writer.submit(self._write, self.db.upsert_catalog_books, copy.deepcopy(books))
+
+    def update_holdings(self, record_id, holdings):
+        """记录某本书最新的馆藏信息（异步写入）"""
+        self._writer.submit(self._write, self.db.update_catalog_holdings, record_id, copy.deepcopy(holdings))
+
+    def _write(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            logger.warning(f"写入本地书目失败: {str(e)}")
+
+    def search(self, query, limit=10):
+        """在本地书目中检索，未找到时返回空列表"""
+        books = self.db.search_catalog(query, limit)
+        if not books:
+            self.misses += 1
+            return []
+        self.hits += 1
+        for book in books:
+            for holding in book['holdings']:
+                holding['status'] = self.UNKNOWN_STATUS
+            book['holdingsPending'] = True
+        return books
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'tokenizer': self.db.catalog_tokenizer,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'pending_writes': self._writer._work_queue.qsize()
+        }
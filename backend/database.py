@@ -2,39 +2,176 @@ import sqlite3
 import logging
 import os
 import datetime
+import functools
+import json
+import threading
+from contextlib import contextmanager
+
+from query_normalizer import normalize_query
 
 # 配置日志
 logger = logging.getLogger('OPACSpider')
 
 db_path = 'library.db'
 
+# 连接池中保留的空闲连接数，超出的连接用完后关闭
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '8'))
+# 等待其他连接释放写锁的最长时间（毫秒）
+DB_BUSY_TIMEOUT = int(os.environ.get('DB_BUSY_TIMEOUT', '5000'))
+
+
+class ConnectionPool:
+    """SQLite连接池，每个线程在一次数据库操作期间独占一个连接
+
+    连接使用WAL模式，读操作不会被写操作阻塞；写操作之间由SQLite的写锁串行化，
+    等待时间由busy_timeout控制。同一线程内嵌套的操作复用同一个连接。
+    """
+
+    def __init__(self, path, size=DB_POOL_SIZE, busy_timeout=DB_BUSY_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.created = 0
+        self.in_use = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout / 1000, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout)}')
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def current(self):
+        """返回当前线程正在使用的连接，不在数据库操作中时返回None"""
+        return getattr(self._local, 'conn', None)
+
+    @contextmanager
+    def connection(self):
+        """取出一个连接供当前线程使用，结束后放回连接池"""
+        conn = self.current()
+        if conn is not None:
+            yield conn
+            return
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            self.in_use += 1
+        if conn is None:
+            conn = self._connect()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            # 未提交的事务不能带给下一个使用者
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                self.in_use -= 1
+                if len(self._idle) < self.size:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def close(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': self.in_use,
+                'created': self.created
+            }
+
+
+def add_search_history_query_key(cursor):
+    """为旧版数据库的搜索历史表添加规范化搜索词列并回填"""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(search_history)").fetchall()]
+    if 'query_key' not in columns:
+        cursor.execute("ALTER TABLE search_history ADD COLUMN query_key TEXT DEFAULT NULL")
+        logger.info("搜索历史表已添加query_key列")
+    rows = cursor.execute("SELECT id, query FROM search_history WHERE query_key IS NULL").fetchall()
+    if rows:
+        cursor.executemany(
+            "UPDATE search_history SET query_key = ? WHERE id = ?",
+            [(normalize_query(query), history_id) for history_id, query in rows]
+        )
+
+
+# 数据库结构迁移，按版本号顺序执行，每个版本只执行一次（记录在schema_version表中）
+# 每个步骤为SQL语句或接收cursor的函数；新增迁移只能追加在末尾，不能修改已发布的版本
+SCHEMA_MIGRATIONS = [
+    (1, '搜索历史添加规范化搜索词列', [add_search_history_query_key]),
+    (2, '访问日志按时间、按用户和时间建立索引', [
+        "CREATE INDEX IF NOT EXISTS idx_access_logs_time ON access_logs (access_time)",
+        "CREATE INDEX IF NOT EXISTS idx_access_logs_user_time ON access_logs (user_id, access_time)"
+    ]),
+    (3, '搜索历史按用户和时间、按搜索时间、按规范化搜索词建立索引', [
+        "CREATE INDEX IF NOT EXISTS idx_search_history_user_time ON search_history (user_id, search_time)",
+        "CREATE INDEX IF NOT EXISTS idx_search_history_time ON search_history (search_time)",
+        "CREATE INDEX IF NOT EXISTS idx_search_history_user_key ON search_history (user_id, query_key, location)"
+    ])
+]
+
+
+def pooled(method):
+    """在方法执行期间为当前线程取出一个连接，方法内通过self.conn使用"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.pool.connection():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class Database:
-    def __init__(self):
-        self.conn = None
-        self.cursor = None
+    def __init__(self, path=None):
+        self.path = path or db_path
+        self.pool = None
         self.connect()
         self.create_tables()
+    
+    @property
+    def conn(self):
+        """当前线程正在使用的连接（只能在@pooled方法内使用）"""
+        conn = self.pool.current()
+        if conn is None:
+            raise RuntimeError('数据库连接只能在@pooled方法内使用')
+        return conn
         
     def connect(self):
-        """连接到SQLite数据库"""
+        """创建数据库连接池"""
         try:
             # 确保数据库目录存在
-            db_dir = os.path.dirname(db_path)
+            db_dir = os.path.dirname(self.path)
             if db_dir and not os.path.exists(db_dir):
                 os.makedirs(db_dir)
                 
-            self.conn = sqlite3.connect(db_path, check_same_thread=False)
-            self.cursor = self.conn.cursor()
-            logger.info(f"成功连接到数据库: {db_path}")
+            self.pool = ConnectionPool(self.path)
+            with self.pool.connection():
+                pass
+            logger.info(f"成功连接到数据库: {self.path}")
         except Exception as e:
             logger.error(f"连接数据库失败: {str(e)}")
             raise
     
+    @pooled
     def create_tables(self):
         """创建用户表、搜索历史表和访问日志表"""
+        cursor = self.conn.cursor()
         try:
             # 创建用户表
-            self.cursor.execute('''
+            cursor.execute('''
                 CREATE TABLE IF NOT EXISTS users (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     username TEXT UNIQUE NOT NULL,
@@ -45,20 +182,21 @@ class Database:
             ''')
             
             # 创建搜索历史表
-            self.cursor.execute('''
+            cursor.execute('''
                 CREATE TABLE IF NOT EXISTS search_history (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     user_id INTEGER NOT NULL,
                     query TEXT NOT NULL,
                     location TEXT DEFAULT '',
                     search_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    query_key TEXT DEFAULT NULL,
                     FOREIGN KEY (user_id) REFERENCES users (id),
                     UNIQUE(user_id, query, location) ON CONFLICT REPLACE
                 )
             ''')
             
             # 创建访问日志表
-            self.cursor.execute('''
+            cursor.execute('''
                 CREATE TABLE IF NOT EXISTS access_logs (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     user_id INTEGER,
@@ -74,23 +212,133 @@ class Database:
                 )
             ''')
             
+            # 创建本地书目镜像表，保存从图书馆抓取到的书目和馆藏地（不含易变的借阅状态）
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS catalog (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    record_id TEXT UNIQUE NOT NULL,
+                    title TEXT NOT NULL,
+                    author TEXT DEFAULT '',
+                    publisher TEXT DEFAULT '',
+                    year TEXT DEFAULT '',
+                    holdings TEXT DEFAULT '[]',
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            self.create_catalog_index()
+            
+            # 创建结构版本表，记录已执行的迁移
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT DEFAULT '',
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
             self.conn.commit()
             logger.info("数据库表创建完成")
         except Exception as e:
             logger.error(f"创建数据库表失败: {str(e)}")
             self.conn.rollback()
             raise
+        self.migrate()
     
+    @pooled
+    def schema_version(self):
+        """返回当前数据库结构版本（未执行过迁移时为0）"""
+        row = self.conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+        return row[0] or 0
+    
+    @pooled
+    def migrate(self, migrations=SCHEMA_MIGRATIONS):
+        """按顺序执行尚未执行的迁移，每个版本在单独的事务中完成
+        
+        使用BEGIN IMMEDIATE取得写锁后再检查版本，多个进程同时启动时每个版本也只执行一次。
+        """
+        cursor = self.conn.cursor()
+        for version, description, steps in migrations:
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                if cursor.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,)).fetchone():
+                    self.conn.rollback()
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(cursor)
+                    else:
+                        cursor.execute(step)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                    (version, description)
+                )
+                self.conn.commit()
+                logger.info(f"数据库迁移完成: 版本 {version}，{description}")
+            except Exception as e:
+                logger.error(f"数据库迁移失败: 版本 {version}，{description}: {str(e)}")
+                self.conn.rollback()
+                raise
+    
+    @pooled
+    def create_catalog_index(self):
+        """为本地书目创建FTS5全文索引，优先使用支持中文子串匹配的trigram分词器"""
+        cursor = self.conn.cursor()
+        self.catalog_tokenizer = None
+        for tokenizer in ('trigram', 'unicode61'):
+            try:
+                cursor.execute(f'''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5(
+                        title, author, publisher,
+                        content='catalog', content_rowid='id', tokenize='{tokenizer}'
+                    )
+                ''')
+                self.catalog_tokenizer = tokenizer
+                break
+            except sqlite3.OperationalError as e:
+                logger.warning(f"创建全文索引失败（分词器: {tokenizer}）: {str(e)}")
+        if not self.catalog_tokenizer:
+            logger.warning("当前SQLite不支持FTS5，本地书目检索将使用LIKE查询")
+            return
+        
+        # 表已存在时以实际的分词器为准
+        row = cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'catalog_fts'").fetchone()
+        if row and 'trigram' not in row[0]:
+            self.catalog_tokenizer = 'unicode61'
+        
+        # 通过触发器保持全文索引与书目表同步
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS catalog_ai AFTER INSERT ON catalog BEGIN
+                INSERT INTO catalog_fts(rowid, title, author, publisher)
+                VALUES (new.id, new.title, new.author, new.publisher);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS catalog_ad AFTER DELETE ON catalog BEGIN
+                INSERT INTO catalog_fts(catalog_fts, rowid, title, author, publisher)
+                VALUES ('delete', old.id, old.title, old.author, old.publisher);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS catalog_au AFTER UPDATE ON catalog BEGIN
+                INSERT INTO catalog_fts(catalog_fts, rowid, title, author, publisher)
+                VALUES ('delete', old.id, old.title, old.author, old.publisher);
+                INSERT INTO catalog_fts(rowid, title, author, publisher)
+                VALUES (new.id, new.title, new.author, new.publisher);
+            END
+        ''')
+    
+    @pooled
     def add_user(self, username, password, campus=None):
         """添加新用户"""
+        cursor = self.conn.cursor()
         try:
-            self.cursor.execute(
+            cursor.execute(
                 "INSERT INTO users (username, password, campus) VALUES (?, ?, ?)",
                 (username, password, campus)
             )
             self.conn.commit()
             logger.info(f"用户注册成功: {username}")
-            return self.cursor.lastrowid
+            return cursor.lastrowid
         except sqlite3.IntegrityError as e:
             logger.error(f"用户注册失败 - 用户名已存在: {username}")
             self.conn.rollback()
@@ -100,34 +348,40 @@ class Database:
             self.conn.rollback()
             raise
     
+    @pooled
     def get_user(self, username):
         """根据用户名获取用户信息"""
+        cursor = self.conn.cursor()
         try:
-            self.cursor.execute(
+            cursor.execute(
                 "SELECT id, username, password, campus FROM users WHERE username = ?",
                 (username,)
             )
-            return self.cursor.fetchone()
+            return cursor.fetchone()
         except Exception as e:
             logger.error(f"获取用户信息失败: {str(e)}")
             raise
     
+    @pooled
     def get_user_by_id(self, user_id):
         """根据用户ID获取用户信息"""
+        cursor = self.conn.cursor()
         try:
-            self.cursor.execute(
+            cursor.execute(
                 "SELECT id, username, password, campus FROM users WHERE id = ?",
                 (user_id,)
             )
-            return self.cursor.fetchone()
+            return cursor.fetchone()
         except Exception as e:
             logger.error(f"根据ID获取用户信息失败: {str(e)}")
             raise
     
+    @pooled
     def update_user_campus(self, user_id, campus):
         """更新用户校区设置"""
+        cursor = self.conn.cursor()
         try:
-            self.cursor.execute(
+            cursor.execute(
                 "UPDATE users SET campus = ? WHERE id = ?",
                 (campus, user_id)
             )
@@ -139,12 +393,23 @@ class Database:
             self.conn.rollback()
             raise
     
-    def add_search_history(self, user_id, query, location=''):
-        """添加搜索历史记录，自动去重"""
+    @pooled
+    def add_search_history(self, user_id, query, location='', query_key=None):
+        """添加搜索历史记录，自动去重
+        
+        规范化后相同的搜索词（如大小写、全角半角、繁简不同）只保留最近一次的原始写法。
+        """
+        if query_key is None:
+            query_key = normalize_query(query)
+        cursor = self.conn.cursor()
         try:
-            self.cursor.execute(
-                "INSERT INTO search_history (user_id, query, location) VALUES (?, ?, ?)",
-                (user_id, query, location)
+            cursor.execute(
+                "DELETE FROM search_history WHERE user_id = ? AND query_key = ? AND location = ?",
+                (user_id, query_key, location)
+            )
+            cursor.execute(
+                "INSERT INTO search_history (user_id, query, location, query_key) VALUES (?, ?, ?, ?)",
+                (user_id, query, location, query_key)
             )
             self.conn.commit()
             logger.info(f"搜索历史记录添加成功: user_id={user_id}, query={query}, location={location}")
@@ -154,16 +419,18 @@ class Database:
             self.conn.rollback()
             raise
     
+    @pooled
     def get_search_history(self, user_id, limit=20):
         """获取用户的搜索历史记录"""
+        cursor = self.conn.cursor()
         try:
-            self.cursor.execute(
+            cursor.execute(
                 "SELECT id, query, location, search_time FROM search_history WHERE user_id = ? ORDER BY search_time DESC LIMIT ?",
                 (user_id, limit)
             )
             # 将元组列表转换为字典列表
             results = []
-            for row in self.cursor.fetchall():
+            for row in cursor.fetchall():
                 results.append({
                     'id': row[0],
                     'query': row[1],
@@ -175,10 +442,34 @@ class Database:
             logger.error(f"获取搜索历史记录失败: {str(e)}")
             raise
     
+    @pooled
+    def get_popular_queries(self, limit=20, days=14, half_life_days=3):
+        """按搜索人数和时间加权返回热门搜索词
+        
+        同一用户的相同搜索只保留最近一条，每条记录的权重随时间衰减，
+        half_life_days天前的记录权重为当天的一半。只统计最近days天的记录。
+        """
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT query, SUM(1.0 / (1 + (julianday('now') - julianday(search_time)) / ?)) AS score, "
+                "COUNT(*) AS searches FROM search_history "
+                "WHERE search_time >= datetime('now', ?) AND trim(query) != '' "
+                "GROUP BY query_key ORDER BY score DESC LIMIT ?",
+                (half_life_days, f'-{int(days)} days', limit)
+            )
+            return [{'query': row[0], 'score': round(row[1], 4), 'searches': row[2]}
+                    for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"获取热门搜索词失败: {str(e)}")
+            raise
+    
+    @pooled
     def delete_search_history(self, user_id, history_id):
         """删除单条搜索历史记录"""
+        cursor = self.conn.cursor()
         try:
-            self.cursor.execute(
+            cursor.execute(
                 "DELETE FROM search_history WHERE user_id = ? AND id = ?",
                 (user_id, history_id)
             )
@@ -190,10 +481,12 @@ class Database:
             self.conn.rollback()
             raise
     
+    @pooled
     def clear_search_history(self, user_id):
         """清空用户的所有搜索历史记录"""
+        cursor = self.conn.cursor()
         try:
-            self.cursor.execute(
+            cursor.execute(
                 "DELETE FROM search_history WHERE user_id = ?",
                 (user_id,)
             )
@@ -205,13 +498,15 @@ class Database:
             self.conn.rollback()
             raise
     
+    @pooled
     def add_access_log(self, user_id=None, username=None, ip_address='', user_agent='', 
                       request_path='', request_method='GET', status_code=200, ip_location=''):
         """添加访问日志记录"""
+        cursor = self.conn.cursor()
         try:
             # 简化IP属地功能，暂时不获取具体位置
             ip_location = ''  # 默认空字符串
-            self.cursor.execute(
+            cursor.execute(
                 "INSERT INTO access_logs (user_id, username, ip_address, user_agent, "
                 "request_path, request_method, status_code, ip_location) "
                 "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
@@ -226,14 +521,39 @@ class Database:
             self.conn.rollback()
             raise
     
+    @pooled
+    def add_access_logs(self, records):
+        """批量添加访问日志记录（在一个事务中写入）
+
+        每条记录为 (user_id, username, ip_address, user_agent, request_path,
+        request_method, status_code, access_time, ip_location)，由后台写入线程调用。
+        """
+        cursor = self.conn.cursor()
+        try:
+            cursor.executemany(
+                "INSERT INTO access_logs (user_id, username, ip_address, user_agent, "
+                "request_path, request_method, status_code, access_time, ip_location) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                records
+            )
+            self.conn.commit()
+            logger.debug(f"批量写入访问日志 {len(records)} 条")
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    
+    @pooled
     def get_all_users(self):
         """获取所有用户信息（不包含密码）"""
+        cursor = self.conn.cursor()
         try:
-            self.cursor.execute(
+            cursor.execute(
                 "SELECT id, username, campus, created_at FROM users ORDER BY created_at DESC"
             )
             results = []
-            for row in self.cursor.fetchall():
+            for row in cursor.fetchall():
                 results.append({
                     'id': row[0],
                     'username': row[1],
@@ -245,17 +565,57 @@ class Database:
             logger.error(f"获取所有用户信息失败: {str(e)}")
             raise
     
-    def get_all_access_logs(self, limit=1000):
-        """获取所有访问日志记录"""
+    @staticmethod
+    def access_log_filters(user_id=None, path=None, status_code=None, ip_address=None,
+                           since=None, until=None, before=None):
+        """生成访问日志查询的WHERE子句和参数
+        
+        path按前缀匹配，since/until为访问时间范围（含两端，格式同access_time），
+        before为上一页最后一条记录的 (access_time, id)，只返回排在它之后的记录（键集分页）。
+        """
+        conditions, params = [], []
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if path:
+            conditions.append("request_path LIKE ? ESCAPE '\\'")
+            params.append(path.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        if status_code is not None:
+            conditions.append("status_code = ?")
+            params.append(status_code)
+        if ip_address:
+            conditions.append("ip_address = ?")
+            params.append(ip_address)
+        if since:
+            conditions.append("access_time >= ?")
+            params.append(since)
+        if until:
+            conditions.append("access_time <= ?")
+            params.append(until)
+        if before:
+            # 行值比较可以直接使用 (access_time, id) 索引定位，翻到多深都只需一次索引查找
+            conditions.append("(access_time, id) < (?, ?)")
+            params.extend(before)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        return where, params
+    
+    @pooled
+    def get_all_access_logs(self, limit=1000, **filters):
+        """获取所有访问日志记录，按访问时间倒序
+        
+        filters见access_log_filters，可按用户、路径、状态码、IP和时间范围筛选并分页。
+        """
+        where, params = self.access_log_filters(**filters)
+        cursor = self.conn.cursor()
         try:
-            self.cursor.execute(
+            cursor.execute(
                 "SELECT id, user_id, username, ip_address, user_agent, request_path, "
                 "request_method, status_code, access_time, ip_location "
-                "FROM access_logs ORDER BY access_time DESC LIMIT ?",
-                (limit,)
+                f"FROM access_logs {where}ORDER BY access_time DESC, id DESC LIMIT ?",
+                (*params, limit)
             )
             results = []
-            for row in self.cursor.fetchall():
+            for row in cursor.fetchall():
                 results.append({
                     'id': row[0],
                     'user_id': row[1],
@@ -273,20 +633,22 @@ class Database:
             logger.error(f"获取所有访问日志记录失败: {str(e)}")
             raise
     
+    @pooled
     def get_statistics(self):
         """获取统计信息：账号总量、访问总量、搜索总量"""
+        cursor = self.conn.cursor()
         try:
             # 获取账号总量
-            self.cursor.execute("SELECT COUNT(*) FROM users")
-            user_count = self.cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM users")
+            user_count = cursor.fetchone()[0]
             
             # 获取访问总量
-            self.cursor.execute("SELECT COUNT(*) FROM access_logs")
-            access_count = self.cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM access_logs")
+            access_count = cursor.fetchone()[0]
             
             # 获取搜索总量
-            self.cursor.execute("SELECT COUNT(*) FROM search_history")
-            search_count = self.cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM search_history")
+            search_count = cursor.fetchone()[0]
             
             return {
                 'user_count': user_count,
@@ -297,17 +659,21 @@ class Database:
             logger.error(f"获取统计信息失败: {str(e)}")
             raise
     
-    def get_user_access_logs(self, user_id, limit=100):
-        """获取指定用户的访问日志记录"""
+    @pooled
+    def get_user_access_logs(self, user_id, limit=100, **filters):
+        """获取指定用户的访问日志记录，按访问时间倒序，filters同get_all_access_logs"""
+        filters['user_id'] = user_id
+        where, params = self.access_log_filters(**filters)
+        cursor = self.conn.cursor()
         try:
-            self.cursor.execute(
+            cursor.execute(
                 "SELECT id, ip_address, user_agent, request_path, request_method, "
                 "status_code, access_time, ip_location "
-                "FROM access_logs WHERE user_id = ? ORDER BY access_time DESC LIMIT ?",
-                (user_id, limit)
+                f"FROM access_logs {where}ORDER BY access_time DESC, id DESC LIMIT ?",
+                (*params, limit)
             )
             results = []
-            for row in self.cursor.fetchall():
+            for row in cursor.fetchall():
                 results.append({
                     'id': row[0],
                     'ip_address': row[1],
@@ -323,10 +689,110 @@ class Database:
             logger.error(f"获取用户访问日志记录失败: {str(e)}")
             raise
     
+    @pooled
+    def upsert_catalog_books(self, books):
+        """将抓取到的图书写入本地书目表，已存在的记录更新书目信息
+        
+        只保存索书号和馆藏地，馆藏为空时保留原有的馆藏信息。
+        """
+        rows = []
+        for book in books:
+            if not book.get('recordId'):
+                continue
+            holdings = [{'callNumber': holding.get('callNumber', ''), 'location': holding.get('location', '')}
+                        for holding in book.get('holdings') or []]
+            rows.append((str(book['recordId']), book.get('title', ''), book.get('author', ''),
+                         book.get('publisher', ''), str(book.get('year', '')),
+                         json.dumps(holdings, ensure_ascii=False)))
+        if not rows:
+            return 0
+        cursor = self.conn.cursor()
+        try:
+            cursor.executemany(
+                "INSERT INTO catalog (record_id, title, author, publisher, year, holdings) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(record_id) DO UPDATE SET "
+                "title = excluded.title, author = excluded.author, publisher = excluded.publisher, "
+                "year = excluded.year, updated_at = CURRENT_TIMESTAMP, "
+                "holdings = CASE WHEN excluded.holdings != '[]' THEN excluded.holdings ELSE catalog.holdings END",
+                rows
+            )
+            self.conn.commit()
+            return len(rows)
+        except Exception as e:
+            logger.error(f"写入本地书目失败: {str(e)}")
+            self.conn.rollback()
+            raise
+    
+    @pooled
+    def update_catalog_holdings(self, record_id, holdings):
+        """更新本地书目中某本书的馆藏信息（只保存索书号和馆藏地）"""
+        holdings = [{'callNumber': holding.get('callNumber', ''), 'location': holding.get('location', '')}
+                    for holding in holdings]
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(
+                "UPDATE catalog SET holdings = ?, updated_at = CURRENT_TIMESTAMP WHERE record_id = ?",
+                (json.dumps(holdings, ensure_ascii=False), str(record_id))
+            )
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"更新本地书目馆藏失败: {str(e)}")
+            self.conn.rollback()
+            raise
+    
+    @pooled
+    def search_catalog(self, query, limit=10):
+        """在本地书目中检索书名、作者和出版社，返回与爬虫相同格式的图书列表"""
+        query = query.strip()
+        if not query:
+            return []
+        cursor = self.conn.cursor()
+        columns = "c.record_id, c.title, c.author, c.publisher, c.year, c.holdings"
+        try:
+            if self.catalog_tokenizer == 'trigram' and len(query) >= 3:
+                # trigram分词器支持任意位置的子串匹配
+                phrase = '"' + query.replace('"', '""') + '"'
+                cursor.execute(
+                    f"SELECT {columns} FROM catalog_fts f JOIN catalog c ON c.id = f.rowid "
+                    "WHERE catalog_fts MATCH ? ORDER BY rank LIMIT ?",
+                    (phrase, limit)
+                )
+            elif self.catalog_tokenizer == 'unicode61':
+                # unicode61按词分词，使用前缀匹配
+                phrase = '"' + query.replace('"', '""') + '"*'
+                cursor.execute(
+                    f"SELECT {columns} FROM catalog_fts f JOIN catalog c ON c.id = f.rowid "
+                    "WHERE catalog_fts MATCH ? ORDER BY rank LIMIT ?",
+                    (phrase, limit)
+                )
+            else:
+                # 查询词太短或不支持FTS5时退回LIKE
+                pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                cursor.execute(
+                    f"SELECT {columns} FROM catalog c WHERE c.title LIKE ? ESCAPE '\\' "
+                    "OR c.author LIKE ? ESCAPE '\\' ORDER BY c.updated_at DESC LIMIT ?",
+                    (pattern, pattern, limit)
+                )
+            results = []
+            for row in cursor.fetchall():
+                results.append({
+                    'title': row[1],
+                    'author': row[2],
+                    'publisher': row[3],
+                    'year': row[4],
+                    'recordId': row[0],
+                    'holdings': json.loads(row[5] or '[]')
+                })
+            return results
+        except Exception as e:
+            logger.error(f"检索本地书目失败: {str(e)}")
+            raise
+    
     def close(self):
         """关闭数据库连接"""
-        if self.conn:
-            self.conn.close()
+        if self.pool:
+            self.pool.close()
             logger.info("数据库连接已关闭")
 
 # 创建全局数据库实例
@@ -1,11 +1,28 @@
 import requests
+import contextvars
+import copy
 import json
 import logging
 import os
+import threading
 import time
 import re
 import urllib.parse
-from bs4 import BeautifulSoup
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait, TimeoutError as FuturesTimeoutError
+from bs4 import BeautifulSoup, Comment
+import lxml.html
+from cache import TTLCache, HoldingsCache
+from records import BooksCodec, HoldingsCodec
+from shared_cache import shared_store
+from singleflight import SingleFlight
+from capture import PageCapture
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from rate_limiter import OutboundRateLimiter
+from query_normalizer import normalize_query
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ReadTimeoutError
+from urllib3.util.retry import Retry
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -14,6 +31,148 @@ logger = logging.getLogger('OPACSpider')
 # 南京大学图书馆OPAC系统的基础URL（新的微信图书馆接口）
 BASE_URL = 'http://weixin.libstar.cn/weixin/unify'
 SEARCH_URL = f'{BASE_URL}/search'
+# 详情页URL（注意：这里不需要 /unify/ 部分）
+DETAIL_URL = f'{BASE_URL.replace("/unify", "")}/searchResultDetail/getDetail'
+# 图书馆服务器的协议和主机部分，用于为其单独挂载连接池
+UPSTREAM_ORIGIN = '{0.scheme}://{0.netloc}/'.format(urllib.parse.urlsplit(BASE_URL))
+
+# 上游连接配置：连接池大小、连接/读取超时（秒）
+UPSTREAM_POOL_SIZE = int(os.environ.get('OPAC_POOL_SIZE', '20'))
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('OPAC_CONNECT_TIMEOUT', '5'))
+UPSTREAM_READ_TIMEOUT = float(os.environ.get('OPAC_READ_TIMEOUT', '30'))
+
+# 重试配置：连接错误和5xx响应最多重试的次数，退避时间带随机抖动
+UPSTREAM_RETRIES = int(os.environ.get('OPAC_RETRIES', '2'))
+UPSTREAM_BACKOFF = float(os.environ.get('OPAC_RETRY_BACKOFF', '0.3'))
+UPSTREAM_BACKOFF_JITTER = float(os.environ.get('OPAC_RETRY_JITTER', '0.3'))
+
+# 熔断配置：连续失败多少次后熔断，熔断多少秒后尝试恢复
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('OPAC_BREAKER_THRESHOLD', '5'))
+BREAKER_RECOVERY_TIMEOUT = float(os.environ.get('OPAC_BREAKER_RECOVERY', '30'))
+
+# 上游限流配置（每秒请求数、突发上限）：全局限流之外，搜索页和详情页分别限流，搜索页优先
+RATE_GLOBAL = float(os.environ.get('OPAC_RATE_GLOBAL', '10'))
+RATE_GLOBAL_BURST = int(os.environ.get('OPAC_RATE_GLOBAL_BURST', '20'))
+RATE_SEARCH = float(os.environ.get('OPAC_RATE_SEARCH', '5'))
+RATE_SEARCH_BURST = int(os.environ.get('OPAC_RATE_SEARCH_BURST', '10'))
+RATE_DETAIL = float(os.environ.get('OPAC_RATE_DETAIL', '8'))
+RATE_DETAIL_BURST = int(os.environ.get('OPAC_RATE_DETAIL_BURST', '16'))
+# 后台任务（缓存预热）的请求不区分搜索页和详情页，使用单独的令牌桶和最低的优先级，不与用户请求争抢配额
+RATE_BACKGROUND = float(os.environ.get('OPAC_RATE_BACKGROUND', '2'))
+RATE_BACKGROUND_BURST = int(os.environ.get('OPAC_RATE_BACKGROUND_BURST', '2'))
+BACKGROUND_PRIORITY = 2
+
+# 进程内所有爬虫实例共享的上游限流器
+outbound_limiter = OutboundRateLimiter(
+    RATE_GLOBAL,
+    RATE_GLOBAL_BURST,
+    endpoints={
+        'search': (RATE_SEARCH, RATE_SEARCH_BURST, 0),
+        'detail': (RATE_DETAIL, RATE_DETAIL_BURST, 1),
+        'background': (RATE_BACKGROUND, RATE_BACKGROUND_BURST, BACKGROUND_PRIORITY)
+    }
+)
+
+# 当前上下文是否在执行后台任务，由OPACSpider.background()设置；
+# 使用ContextVar而不是threading.local，提交到事件循环的协程也能继承该标记
+_background = contextvars.ContextVar('opac_background', default=False)
+
+# 并发获取馆藏详情的线程数上限（所有搜索请求共享，避免对图书馆服务器造成过大压力）
+DETAIL_FETCH_WORKERS = int(os.environ.get('OPAC_DETAIL_WORKERS', '5'))
+
+# 搜索结果缓存配置：最多缓存的查询数和过期时间（秒）
+# 超过SEARCH_CACHE_TTL后仍直接返回缓存并在后台刷新，超过SEARCH_CACHE_STALE_TTL后才需要等待上游
+SEARCH_CACHE_SIZE = int(os.environ.get('OPAC_SEARCH_CACHE_SIZE', '512'))
+SEARCH_CACHE_TTL = int(os.environ.get('OPAC_SEARCH_CACHE_TTL', '600'))
+SEARCH_CACHE_STALE_TTL = int(os.environ.get('OPAC_SEARCH_CACHE_STALE_TTL', '3600'))
+
+# 馆藏信息缓存配置：索书号/馆藏地保留较长时间，借阅状态较短时间后重新抓取
+HOLDINGS_CACHE_SIZE = int(os.environ.get('OPAC_HOLDINGS_CACHE_SIZE', '4096'))
+HOLDINGS_STATIC_TTL = int(os.environ.get('OPAC_HOLDINGS_STATIC_TTL', '86400'))
+HOLDINGS_STATUS_TTL = int(os.environ.get('OPAC_HOLDINGS_STATUS_TTL', '300'))
+# 借阅状态超过HOLDINGS_STATUS_TTL后仍直接返回并在后台刷新，超过该时间后才需要等待上游
+HOLDINGS_STATUS_STALE_TTL = int(os.environ.get('OPAC_HOLDINGS_STATUS_STALE_TTL', '1800'))
+
+# 后台刷新过期缓存的线程数，以及最多同时排队和执行的刷新任务数（超出时放弃刷新，继续使用旧缓存）
+REVALIDATE_WORKERS = int(os.environ.get('OPAC_REVALIDATE_WORKERS', '2'))
+REVALIDATE_QUEUE_SIZE = int(os.environ.get('OPAC_REVALIDATE_QUEUE_SIZE', '32'))
+# 限流器中排队的用户请求达到该数量时放弃后台刷新
+REVALIDATE_MAX_USER_WAITING = int(os.environ.get('OPAC_REVALIDATE_MAX_USER_WAITING', '5'))
+
+# 批量搜索时同时进行的搜索数（详情请求仍由详情线程池和限流器统一限制）
+SEARCH_BATCH_WORKERS = int(os.environ.get('OPAC_SEARCH_BATCH_WORKERS', '4'))
+
+# 一次搜索请求（含所有详情请求）的总时间预算（秒），超时后尚未获取到的馆藏标记为holdingsPending
+SEARCH_DEADLINE = float(os.environ.get('OPAC_SEARCH_DEADLINE', '10'))
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """请求的截止时间已到，不再等待上游"""
+
+
+def time_left(deadline):
+    """距离截止时间（time.monotonic()的值）还剩的秒数，最小为0；deadline为None时返回None"""
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def _is_read_timeout(error):
+    """判断requests异常是否由读取超时引起
+
+    连接池的Retry设置了read=0，读取超时不会以requests的Timeout抛出，而是
+    包装为ConnectionError(MaxRetryError(ReadTimeoutError))；读取响应体时超时则为
+    ConnectionError(ReadTimeoutError)。
+    """
+    if isinstance(error, requests.exceptions.Timeout):
+        return True
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, ReadTimeoutError)
+
+# 详情页解析引擎：lxml（XPath直接解析，较快）或 bs4（BeautifulSoup，lxml解析失败时的回退方案）
+DETAIL_PARSER = os.environ.get('OPAC_DETAIL_PARSER', 'lxml')
+
+# 按class匹配元素的XPath（等价于CSS的 .loc_item 等选择器）
+_TAB1_XPATH = '//*[@id="tab1"]'
+_LOC_ITEM_XPATH = './/*[contains(concat(" ", normalize-space(@class), " "), " loc_item ")]'
+_LOC_TITLE_XPATH = './/*[contains(concat(" ", normalize-space(@class), " "), " loc_title ")]'
+_LOC_INFO_XPATH = './/*[contains(concat(" ", normalize-space(@class), " "), " loc_info ")]'
+# 提取馆藏文本时跳过这些元素的内容，两种解析引擎保持一致，不依赖BeautifulSoup版本的默认行为
+_SKIP_TEXT_TAGS = frozenset(('script', 'style'))
+
+
+def _lxml_text(element):
+    """与_soup_text相同：逐段去除空白后拼接元素内的文本，跳过脚本、样式和注释"""
+    def strings(node):
+        if node.text:
+            yield node.text
+        for child in node:
+            # 注释和处理指令的tag不是字符串，只保留其后的文本
+            if isinstance(child.tag, str) and child.tag.lower() not in _SKIP_TEXT_TAGS:
+                yield from strings(child)
+            if child.tail:
+                yield child.tail
+    return ''.join(text.strip() for text in strings(element))
+
+
+def _soup_text(tag):
+    """等价于get_text(strip=True)，但始终跳过脚本、样式和注释"""
+    return ''.join(
+        text.strip() for text in tag.find_all(string=True)
+        if not isinstance(text, Comment) and text.parent.name not in _SKIP_TEXT_TAGS
+    )
+
+# 搜索页中内嵌图书数据的脚本变量（var data = {...}），只定位起点，JSON由解码器按语法截取
+_EMBEDDED_JSON_ANCHOR = re.compile(r'var\s+data\s*=\s*')
+_JSON_DECODER = json.JSONDecoder()
+
+# 上游页面采样配置（默认关闭），采样的页面可通过 replay.py 离线回放
+CAPTURE_SAMPLE_RATE = float(os.environ.get('OPAC_CAPTURE_RATE', '0'))
+CAPTURE_DIR = os.environ.get('OPAC_CAPTURE_DIR', 'captures')
+CAPTURE_MAX_FILES = int(os.environ.get('OPAC_CAPTURE_MAX_FILES', '200'))
+CAPTURE_MAX_MB = int(os.environ.get('OPAC_CAPTURE_MAX_MB', '50'))
 
 class OPACSpider:
     def __init__(self):
@@ -27,42 +186,496 @@ class OPACSpider:
         }
         logger.debug(f"设置请求头: {self.headers}")
         self.session = requests.Session()  # 使用会话维持连接
+        # 为图书馆服务器单独挂载连接池，池大小需覆盖详情线程池和并发的搜索请求
+        retry = Retry(
+            total=UPSTREAM_RETRIES,
+            connect=UPSTREAM_RETRIES,
+            read=0,
+            status=UPSTREAM_RETRIES,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=['GET'],
+            backoff_factor=UPSTREAM_BACKOFF,
+            backoff_jitter=UPSTREAM_BACKOFF_JITTER,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=UPSTREAM_POOL_SIZE, max_retries=retry)
+        self.session.mount(UPSTREAM_ORIGIN, adapter)
+        self.timeout = (UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT)
+        # 上游熔断器，图书馆服务器不可用时快速失败
+        self.breaker = CircuitBreaker(
+            failure_threshold=BREAKER_FAILURE_THRESHOLD,
+            recovery_timeout=BREAKER_RECOVERY_TIMEOUT,
+            name='opac'
+        )
+        self.limiter = outbound_limiter
+        # 抓取到的书目和馆藏的记录方（如本地书目镜像），需提供add_books和update_holdings方法
+        self.catalog_sink = None
         logger.debug("创建requests会话成功")
         # 禁用SSL证书验证（开发环境）
         self.session.verify = False
         logger.warning("SSL证书验证已禁用（仅用于开发环境）")
+        # 馆藏详情获取线程池，限制同时发往图书馆的详情请求数
+        self.detail_executor = ThreadPoolExecutor(
+            max_workers=DETAIL_FETCH_WORKERS,
+            thread_name_prefix='opac-detail'
+        )
+        logger.debug(f"馆藏详情线程池创建成功，并发上限: {DETAIL_FETCH_WORKERS}")
+        # 搜索结果缓存，键为(规范化书名, 页码, 每页数量)，只保存书目信息和recordId（馆藏经馆藏缓存获取），以紧凑的Book记录保存
+        # 配置OPAC_SHARED_CACHE_PATH时，搜索结果和馆藏缓存保存在同一主机上所有进程共享的SQLite文件中
+        self.search_cache = TTLCache(
+            max_size=SEARCH_CACHE_SIZE,
+            ttl=SEARCH_CACHE_STALE_TTL,
+            soft_ttl=SEARCH_CACHE_TTL,
+            name='search',
+            codec=BooksCodec,
+            store=shared_store
+        )
+        # 馆藏信息缓存，键为recordId，不同关键词搜到同一本书时可复用，以紧凑的Holding记录保存
+        self.holdings_cache = HoldingsCache(
+            max_size=HOLDINGS_CACHE_SIZE,
+            static_ttl=HOLDINGS_STATIC_TTL,
+            status_ttl=HOLDINGS_STATUS_TTL,
+            status_stale_ttl=HOLDINGS_STATUS_STALE_TTL,
+            codec=HoldingsCodec,
+            store=shared_store
+        )
+        # 后台刷新过期缓存（stale-while-revalidate），同一条目同时只刷新一次；
+        # 刷新任务在专用线程中以后台优先级执行，不占用详情线程池
+        self.revalidate_executor = ThreadPoolExecutor(
+            max_workers=REVALIDATE_WORKERS,
+            thread_name_prefix='opac-revalidate'
+        )
+        self._revalidating = set()
+        self._revalidate_lock = threading.Lock()
+        self.revalidations = 0
+        self.revalidations_dropped = 0
+        # 批量搜索线程池
+        self.batch_executor = ThreadPoolExecutor(
+            max_workers=SEARCH_BATCH_WORKERS,
+            thread_name_prefix='opac-batch'
+        )
+        # 合并相同的并发请求，同一搜索/同一recordId只向图书馆发起一次
+        self.search_flight = SingleFlight(name='search')
+        self.detail_flight = SingleFlight(name='detail')
+        # 上游页面采样，写入在后台线程中完成
+        self.capture = PageCapture(
+            directory=CAPTURE_DIR,
+            sample_rate=CAPTURE_SAMPLE_RATE,
+            max_files=CAPTURE_MAX_FILES,
+            max_bytes=CAPTURE_MAX_MB * 1024 * 1024
+        )
         
         logger.info("南京大学图书馆OPAC爬虫初始化完成")
     
-    def search_books_by_title(self, title, page=1, max_results=10):
-        """根据书名搜索图书"""
+    def search_books_by_title(self, title, page=1, max_results=10, with_holdings=True, deadline=None):
+        """根据书名搜索图书
+        
+        with_holdings为False时只请求一次搜索页，返回书目信息和recordId，
+        馆藏信息留空并标记holdingsPending，由调用方稍后通过get_holdings_batch获取。
+        deadline为截止时间（time.monotonic()的值），到期时尚未获取到的馆藏同样标记holdingsPending。
+        每本书的dataAge字段为数据已缓存的秒数（已获取馆藏的图书为馆藏信息的缓存时间，刚从上游获取时为0）。
+        """
         logger = logging.getLogger('OPACSpider')
         logger.info(f"开始搜索图书: {title}")
         
+        cache_key = (self._normalize_title(title), page, max_results)
+        entry = self._get_bib(cache_key, title, page, max_results, deadline)
+        if entry is None:
+            return self._fallback_books(title, max_results, deadline)
+        books, age = entry
+        
+        # 搜索缓存只保存书目信息，馆藏每次都经馆藏缓存获取，借阅状态遵循馆藏缓存的过期时间
+        if with_holdings:
+            self._fill_holdings(books, deadline=deadline)
+        else:
+            for book in books:
+                if book.get('recordId'):
+                    book['holdingsPending'] = True
+        return self._with_age(books, age)
+    
+    def _get_bib(self, cache_key, title, page, max_results, deadline=None):
+        """获取书目信息（不含馆藏），返回 (图书列表, 已缓存的秒数)，没有可用的结果时返回None
+        
+        依次使用搜索缓存、上游搜索（相同的并发搜索只请求一次）和上游失败时已过期的缓存。
+        """
+        logger = logging.getLogger('OPACSpider')
+        entry = self._get_cached_bib(cache_key, title, page, max_results)
+        if entry is not None:
+            logger.info(f"搜索结果命中缓存: {title}")
+            return entry
+        
+        # 等待其他请求的结果时同样不超过本次的截止时间
         try:
-            # 使用用户提供的正确URL结构
-            search_params = {
-                'mappingPath': 'njulib',
-                'groupCode': '200027',
-                'openid': 'oeL7DjraEzAnkWJpPrebGqI6B55I',
-                'pubId': '1',
-                'searchFieldContent': title,
-                'searchField': 'keyWord',
-                'page': page,
-                'rows': max_results
-            }
+            books = self.search_flight.do(cache_key, self._search_bib_and_cache, cache_key, title, page,
+                                          max_results, deadline, timeout=time_left(deadline))
+        except TimeoutError:
+            logger.warning(f"等待相同的搜索请求到达截止时间: {title}")
+            books = []
+        if books:
+            return books, 0
+        return self._get_stale_bib(cache_key, title)
+    
+    def _get_cached_bib(self, cache_key, title, page, max_results):
+        """读取搜索缓存中的书目信息，返回 (图书列表, 已缓存的秒数)，未命中时返回None
+        
+        超过软过期时间的结果仍直接返回，同时在后台刷新（stale-while-revalidate）。
+        """
+        entry = self.search_cache.get_with_age(cache_key)
+        if entry is None:
+            return None
+        age = entry[1]
+        if age > self.search_cache.soft_ttl:
+            logging.getLogger('OPACSpider').info(f"搜索结果已缓存 {int(age)} 秒，后台刷新: {title}")
+            self._revalidate(('search',) + cache_key, self.refresh_books_by_title, title, page, max_results)
+        return entry
+    
+    def _get_stale_bib(self, cache_key, title):
+        """上游搜索失败时使用已过期的书目缓存，返回 (图书列表, 已缓存的秒数)，没有时返回None"""
+        stale = self.search_cache.get_stale(cache_key)
+        if stale is not None:
+            logging.getLogger('OPACSpider').warning(f"上游搜索失败，使用 {int(stale[1])} 秒前的缓存结果: {title}")
+        return stale
+    
+    def _with_age(self, books, age):
+        """为每本书添加dataAge字段（数据已缓存的秒数）
+        
+        已获取馆藏的图书取馆藏信息的缓存时间，其余取书目信息的缓存时间age。
+        """
+        for book in books:
+            holdings_age = None
+            if book.get('recordId') and not book.get('holdingsPending'):
+                holdings_age = self.holdings_age(book['recordId'])
+            book['dataAge'] = int(age if holdings_age is None else holdings_age)
+        return books
+    
+    def _revalidate(self, key, fn, *args):
+        """在后台执行fn(*args)刷新缓存，相同key正在刷新时忽略
+        
+        刷新任务过多或限流器中排队的用户请求较多时放弃本次刷新，调用方继续使用旧缓存，
+        之后的请求会再次触发刷新。
+        """
+        saturated = self.limiter.waiting(max_priority=BACKGROUND_PRIORITY - 1) >= REVALIDATE_MAX_USER_WAITING
+        with self._revalidate_lock:
+            if key in self._revalidating:
+                return
+            if saturated or len(self._revalidating) >= REVALIDATE_QUEUE_SIZE:
+                self.revalidations_dropped += 1
+                return
+            self._revalidating.add(key)
+            self.revalidations += 1
+        
+        def run():
+            try:
+                with self.background():
+                    fn(*args)
+            except Exception as e:
+                logging.getLogger('OPACSpider').warning(f"后台刷新缓存失败: {key}: {str(e)}")
+            finally:
+                with self._revalidate_lock:
+                    self._revalidating.discard(key)
+        
+        self.revalidate_executor.submit(run)
+    
+    def _fallback_books(self, title, max_results, deadline=None):
+        """上游搜索失败且没有缓存结果时回退到模拟数据
+
+        因到达截止时间而没有结果时不使用模拟数据，返回空列表，由调用方稍后重试。
+        """
+        logger = logging.getLogger('OPACSpider')
+        if time_left(deadline) == 0:
+            logger.warning(f"搜索到达截止时间，没有可用的结果: {title}")
+            return []
+        
+        # 如果所有方法都失败，回退到模拟数据（模拟数据不写入缓存）
+        logger.warning("所有搜索方法失败，回退到模拟数据")
+        return self._get_mock_data(title, max_results)
+    
+    def search_books_batch(self, titles, max_results=10, with_holdings=True, deadline=None):
+        """并发搜索多个书名，返回与titles顺序一致的结果列表
+        
+        规范化后相同的书名只搜索一次；所有搜索共享缓存、合并请求、详情线程池和限流器，
+        不同书名搜到同一本书时馆藏只获取一次。
+        到达截止时间deadline时取消尚未开始的搜索，未得到结果的书名对应的结果为None，调用方可稍后重试。
+        """
+        logger = logging.getLogger('OPACSpider')
+        futures = {}
+        for title in titles:
+            key = self._normalize_title(title)
+            if key not in futures:
+                futures[key] = self.batch_executor.submit(
+                    self.search_books_by_title, title, 1, max_results, with_holdings, deadline
+                )
+        logger.info(f"批量搜索 {len(titles)} 个书名，去重后 {len(futures)} 个")
+        
+        done, not_done = wait(futures.values(), timeout=time_left(deadline))
+        if not_done:
+            # 已开始的搜索在后台完成并写入缓存，尚未开始的直接取消
+            logger.warning(f"批量搜索到达截止时间，{len(not_done)} 个书名未完成")
+            for future in not_done:
+                future.cancel()
+        
+        results = []
+        for title in titles:
+            future = futures[self._normalize_title(title)]
+            if future not in done:
+                results.append(None)
+                continue
+            try:
+                books = future.result()
+            except Exception as e:
+                # search_books_by_title内部已处理异常，这里仅作兜底
+                logger.warning(f"批量搜索失败: {title}，错误: {str(e)}")
+                books = []
+            if not books and time_left(deadline) == 0:
+                # 搜索因截止时间没有得到结果，与未完成的书名同样处理
+                results.append(None)
+                continue
+            # 重复的书名各自持有一份副本
+            results.append(copy.deepcopy(books))
+        return results
+    
+    def iter_books_by_title(self, title, page=1, max_results=10, deadline=None):
+        """根据书名搜索图书，每本书的馆藏信息获取完成后立即产出 (序号, 图书)
+        
+        产出顺序为馆藏获取完成的顺序，序号为该书在搜索结果中的位置。
+        书目信息可来自搜索缓存，馆藏信息经馆藏缓存获取；调用方提前关闭生成器时取消尚未开始的详情请求。
+        到达截止时间deadline时，其余图书标记holdingsPending后立即产出。
+        """
+        logger = logging.getLogger('OPACSpider')
+        logger.info(f"开始流式搜索图书: {title}")
+        
+        cache_key = (self._normalize_title(title), page, max_results)
+        entry = self._get_bib(cache_key, title, page, max_results, deadline)
+        if entry is None:
+            yield from enumerate(self._fallback_books(title, max_results, deadline))
+            return
+        books, age = entry
+        
+        futures = {}
+        for index, book in enumerate(books):
+            if book.get('recordId'):
+                futures[self._submit_detail(book['recordId'], True, deadline)] = index
+            else:
+                yield index, book
+        
+        yielded = set()
+        try:
+            try:
+                for future in as_completed(futures, timeout=time_left(deadline)):
+                    index = futures[future]
+                    try:
+                        books[index]['holdings'] = future.result()
+                    except DeadlineExceeded:
+                        continue
+                    except Exception as e:
+                        # get_book_details内部已处理异常，这里仅作兜底
+                        logger.warning(f"获取馆藏信息失败，record_id: {books[index]['recordId']}，错误: {str(e)}")
+                        books[index]['holdings'] = []
+                    yielded.add(index)
+                    # 产出副本，调用方修改不影响books中的数据
+                    yield index, self._with_age([copy.deepcopy(books[index])], age)[0]
+            except FuturesTimeoutError:
+                pass
+            
+            # 截止时间已到仍未获取到馆藏的图书，标记holdingsPending后产出
+            pending = [index for index in futures.values() if index not in yielded]
+            if pending:
+                logger.warning(f"流式搜索到达截止时间，{len(pending)} 本图书的馆藏信息未获取: {title}")
+                for index in pending:
+                    book = copy.deepcopy(books[index])
+                    book['holdingsPending'] = True
+                    yield index, self._with_age([book], age)[0]
+        finally:
+            # 调用方提前关闭生成器或到达截止时间时取消尚未开始的详情请求（已完成的不受影响）
+            for future in futures:
+                future.cancel()
+    
+    def _search_bib_and_cache(self, cache_key, title, page, max_results, deadline=None):
+        """执行上游搜索并缓存书目信息（由SingleFlight保证同一key同时只执行一次）
+        
+        搜索缓存只保存书目信息和recordId，不含馆藏。
+        """
+        # 等待期间其他请求可能已写入缓存
+        books = self.search_cache.get(cache_key)
+        if books is not None:
+            return books
+        books = self._search_upstream(title, page, max_results, deadline)
+        if books:
+            self.search_cache.set(cache_key, books)
+            self._record_books(books)
+        return books
+    
+    def refresh_books_by_title(self, title, page=1, max_results=10):
+        """忽略搜索缓存重新请求上游并更新缓存（用于后台预热）
+        
+        失败时返回空列表，不回退到模拟数据，原有缓存保持不变。
+        """
+        cache_key = (self._normalize_title(title), page, max_results)
+        return self.search_flight.do(cache_key, self._refresh_and_cache, cache_key, title, page, max_results)
+    
+    def _refresh_and_cache(self, cache_key, title, page, max_results):
+        books = self._search_upstream(title, page, max_results)
+        if books:
+            self.search_cache.set(cache_key, books)
+            self._record_books(books)
+            # 同时刷新借阅状态已过期的馆藏缓存
+            self._fill_holdings(books, allow_stale=False)
+        return books
+    
+    def _get(self, url, params, endpoint, deadline=None):
+        """向图书馆服务器发送GET请求，经过熔断器和限流器；连接错误和5xx计为失败
+        
+        指定deadline时，排队和连接/读取超时都不超过剩余时间，到期时抛出DeadlineExceeded。
+        """
+        if time_left(deadline) == 0:
+            raise DeadlineExceeded(f'已到达截止时间，跳过请求: {endpoint}')
+        if not self.breaker.allow_request():
+            raise CircuitOpenError('图书馆服务器暂时不可用（熔断中）')
+        # 得到上游的结果后才计入熔断；在此之前的任何异常（截止时间、限流器等）只释放试探名额
+        recorded = False
+        try:
+            try:
+                waited = self.limiter.acquire(self._limiter_endpoint(endpoint), timeout=time_left(deadline))
+            except TimeoutError as e:
+                raise DeadlineExceeded(str(e)) from e
+            if waited > 0.1:
+                logger.info(f"上游请求排队 {waited:.2f} 秒: {endpoint}")
+            timeout = self.timeout
+            remaining = time_left(deadline)
+            if remaining is not None:
+                timeout = (min(timeout[0], remaining), min(timeout[1], remaining))
+            if remaining == 0:
+                raise DeadlineExceeded(f'已到达截止时间，跳过请求: {endpoint}')
+            try:
+                response = self.session.get(url, params=params, headers=self.headers, timeout=timeout)
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                # 4xx说明服务器可用，不计入熔断
+                if e.response is not None and e.response.status_code < 500:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+                recorded = True
+                raise
+            except requests.exceptions.RequestException as e:
+                if timeout != self.timeout and _is_read_timeout(e):
+                    # 因截止时间缩短了超时，无法判断上游是否异常，不计入熔断
+                    raise DeadlineExceeded(str(e)) from e
+                self.breaker.record_failure()
+                recorded = True
+                raise
+            self.breaker.record_success()
+            recorded = True
+            return response
+        finally:
+            if not recorded:
+                self.breaker.record_cancelled()
+    
+    @contextmanager
+    def background(self):
+        """在with块内发往上游的请求按后台任务处理
+
+        请求使用最低优先级的background限流端点；馆藏详情在当前线程中逐个获取，不占用详情线程池。
+        """
+        token = _background.set(True)
+        try:
+            yield
+        finally:
+            _background.reset(token)
+
+    def _limiter_endpoint(self, endpoint):
+        return 'background' if _background.get() else endpoint
+
+    def _record_books(self, books):
+        """将抓取到的图书交给catalog_sink记录"""
+        if self.catalog_sink is None:
+            return
+        try:
+            self.catalog_sink.add_books(books)
+        except Exception as e:
+            logger.warning(f"记录书目失败: {str(e)}")
+    
+    def _record_holdings(self, record_id, holdings):
+        """将抓取到的馆藏信息交给catalog_sink记录"""
+        if self.catalog_sink is None:
+            return
+        try:
+            self.catalog_sink.update_holdings(record_id, holdings)
+        except Exception as e:
+            logger.warning(f"记录馆藏信息失败: {str(e)}")
+    
+    def stats(self):
+        """返回爬虫运行统计信息（用于后台监控）"""
+        return {
+            'engine': 'requests',
+            'search_cache': self.search_cache.stats(),
+            'holdings_cache': self.holdings_cache.stats(),
+            'search_flight': self.search_flight.stats(),
+            'detail_flight': self.detail_flight.stats(),
+            'revalidate': {
+                'workers': REVALIDATE_WORKERS,
+                'queue_size': REVALIDATE_QUEUE_SIZE,
+                'started': self.revalidations,
+                'dropped': self.revalidations_dropped,
+                'in_flight': len(self._revalidating)
+            },
+            'shared_cache': shared_store.stats() if shared_store is not None else None,
+            'capture': self.capture.stats(),
+            'breaker': self.breaker.stats(),
+            'rate_limiter': self.limiter.stats(),
+            'catalog': self.catalog_sink.stats() if self.catalog_sink is not None else None
+        }
+    
+    def _normalize_title(self, title):
+        """规范化书名作为缓存和合并请求的键（NFKC、空白和大小写折叠、繁简折叠），上游仍使用原始书名"""
+        return normalize_query(title)
+    
+    def _search_params(self, title, page, max_results):
+        """构造搜索接口的请求参数"""
+        # 使用用户提供的正确URL结构
+        return {
+            'mappingPath': 'njulib',
+            'groupCode': '200027',
+            'openid': 'oeL7DjraEzAnkWJpPrebGqI6B55I',
+            'pubId': '1',
+            'searchFieldContent': title,
+            'searchField': 'keyWord',
+            'page': page,
+            'rows': max_results
+        }
+    
+    def _detail_params(self, record_id):
+        """构造详情页的请求参数"""
+        return {
+            'recordId': record_id,
+            'mappingPath': 'njulib',
+            'groupCode': '200027',
+            'openid': 'oeL7DjraEzAnkWJpPrebGqI6B55I',
+            'pubId': '1'
+        }
+    
+    def _search_upstream(self, title, page, max_results, deadline=None):
+        """请求图书馆搜索接口并解析书目信息（不含馆藏），失败时返回空列表"""
+        logger = logging.getLogger('OPACSpider')
+        try:
+            search_params = self._search_params(title, page, max_results)
             
             logger.info(f"发送搜索请求到: {SEARCH_URL}，参数: {search_params}")
             
             # 发送HTTP请求
-            response = self.session.get(SEARCH_URL, params=search_params, headers=self.headers, timeout=30)
-            response.raise_for_status()
+            response = self._get(SEARCH_URL, search_params, 'search', deadline)
             
             logger.info(f"搜索请求成功，状态码: {response.status_code}")
             
             # 直接解析HTML响应，从JavaScript代码中提取JSON数据
-            return self._parse_html_response(response.text, title, max_results)
+            books = self._parse_books(response.text, title, max_results)
+            self.capture.capture('search', search_params, response.text, books)
+            return books
                 
+        except CircuitOpenError as e:
+            logger.warning(f"跳过搜索请求: {str(e)}")
+        except DeadlineExceeded as e:
+            logger.warning(f"搜索请求到达截止时间: {str(e)}")
         except requests.exceptions.RequestException as e:
             logger.error(f"网络请求出错: {str(e)}")
         except json.JSONDecodeError as e:
@@ -71,10 +684,7 @@ class OPACSpider:
             logger.error(f"搜索过程中出错: {str(e)}")
             import traceback
             logger.error(f"错误详情: {traceback.format_exc()}")
-        
-        # 如果所有方法都失败，回退到模拟数据
-        logger.warning("所有搜索方法失败，回退到模拟数据")
-        return self._get_mock_data(title, max_results)
+        return []
     
     def _parse_original_response(self, title, page, max_results):
         """使用原始的HTML解析方法作为回退方案"""
@@ -96,8 +706,7 @@ class OPACSpider:
         
         try:
             # 发送HTTP请求
-            response = self.session.get(SEARCH_URL, params=search_params, headers=self.headers, timeout=30)
-            response.raise_for_status()
+            response = self._get(SEARCH_URL, search_params, 'search')
             
             logger.info(f"HTML请求成功，状态码: {response.status_code}")
             
@@ -108,160 +717,337 @@ class OPACSpider:
             return self._get_mock_data(title, max_results)
     
     # 添加一个简单的HTML解析方法作为备选
-    def get_book_details(self, record_id):
-        """获取图书的详细馆藏信息"""
+    def get_book_details(self, record_id, allow_stale=True, deadline=None):
+        """获取图书的详细馆藏信息
+        
+        allow_stale为False时不使用超过软过期时间的借阅状态，直接重新抓取。
+        需要抓取但到达截止时间deadline时抛出DeadlineExceeded。
+        """
         logger = logging.getLogger('OPACSpider')
         logger.info(f"获取图书详情，record_id: {record_id}")
         
+        # 借阅状态未超过硬过期时间时直接使用缓存，超过软过期时间的在后台刷新
+        entry = self.holdings_cache.get_with_age(record_id)
+        if entry is not None:
+            holdings, age = entry
+            if age <= self.holdings_cache.status_ttl:
+                logger.info(f"馆藏信息命中缓存，record_id: {record_id}")
+                return holdings
+            if allow_stale:
+                logger.info(f"馆藏信息已缓存 {int(age)} 秒，后台刷新，record_id: {record_id}")
+                self._revalidate(('detail', record_id), self._refresh_details, record_id)
+                return holdings
+        
+        # 相同recordId的并发请求共享同一次详情页抓取
+        holdings = self._refresh_details(record_id, deadline)
+        if holdings is not None:
+            return holdings
+        if time_left(deadline) == 0:
+            raise DeadlineExceeded(f'获取馆藏信息到达截止时间，record_id: {record_id}')
+        
+        # 抓取失败时，使用缓存中的索书号和馆藏地，借阅状态标记为未知
+        holdings = self.holdings_cache.get_static(record_id)
+        if holdings is not None:
+            logger.warning(f"详情页抓取失败，使用缓存的馆藏信息（状态未知），record_id: {record_id}")
+            return holdings
+        return []
+    
+    def _refresh_details(self, record_id, deadline=None):
+        """重新抓取借阅状态已过期的馆藏信息，失败时返回None
+
+        等待相同recordId的其他请求时到达截止时间则抛出DeadlineExceeded。
+        """
         try:
-            # 构造详情页URL（注意：这里不需要 /unify/ 部分）
-            detail_url = f'{BASE_URL.replace("/unify", "")}/searchResultDetail/getDetail'
-            detail_params = {
-                'recordId': record_id,
-                'mappingPath': 'njulib',
-                'groupCode': '200027',
-                'openid': 'oeL7DjraEzAnkWJpPrebGqI6B55I',
-                'pubId': '1'
-            }
-            
-            response = self.session.get(detail_url, params=detail_params, headers=self.headers, timeout=30)
-            response.raise_for_status()
-            
-            from bs4 import BeautifulSoup
-            soup = BeautifulSoup(response.text, 'lxml')
-            
-            # 提取物理馆藏信息
-            holdings = []
+            return self.detail_flight.do(record_id, self._fetch_and_cache_details, record_id, deadline,
+                                         timeout=time_left(deadline))
+        except TimeoutError as e:
+            raise DeadlineExceeded(f'等待相同的详情请求到达截止时间，record_id: {record_id}') from e
+    
+    def holdings_age(self, record_id):
+        """返回馆藏信息已缓存的秒数，没有缓存时返回None"""
+        return self.holdings_cache.age(record_id)
+    
+    def _fetch_and_cache_details(self, record_id, deadline=None):
+        """抓取详情页并写入馆藏缓存（由SingleFlight保证同一recordId同时只执行一次）"""
+        holdings = self.holdings_cache.get(record_id)
+        if holdings is not None:
+            return holdings
+        holdings = self._fetch_book_details(record_id, deadline)
+        if holdings is not None:
+            self.holdings_cache.set(record_id, holdings)
+            self._record_holdings(record_id, holdings)
+        return holdings
+    
+    def _fetch_book_details(self, record_id, deadline=None):
+        """抓取并解析详情页中的馆藏信息，失败时返回None"""
+        logger = logging.getLogger('OPACSpider')
+        try:
+            detail_params = self._detail_params(record_id)
+            response = self._get(DETAIL_URL, detail_params, 'detail', deadline)
             
-            # 查找物理馆藏选项卡
-            tab1 = soup.select_one('#tab1')
-            if tab1:
-                # 查找所有馆藏条目
-                loc_items = tab1.select('.loc_item')
-                logger.info(f"找到 {len(loc_items)} 个馆藏条目")
-                
-                for item in loc_items:
-                    try:
-                        # 提取馆藏地和状态
-                        loc_title = item.select_one('.loc_title')
-                        if loc_title:
-                            title_text = loc_title.get_text(strip=True)
-                            # 解析馆藏地和状态
-                            location_status = title_text.split('|')
-                            location = location_status[0].strip() if len(location_status) > 0 else '未知馆藏地'
-                            status = location_status[1].strip() if len(location_status) > 1 else '未知状态'
-                            
-                            # 提取索书号
-                            loc_info = item.select_one('.loc_info')
-                            call_number = ''
-                            if loc_info:
-                                info_text = loc_info.get_text(strip=True)
-                                # 提取索书号（第一个|之前的内容）
-                                if '|' in info_text:
-                                    call_number = info_text.split('|')[0].strip()
-                                else:
-                                    call_number = info_text.strip()
-                            
-                            holding = {
-                                'callNumber': call_number,
-                                'location': location,
-                                'status': status
-                            }
-                            holdings.append(holding)
-                    except Exception as e:
-                        logger.warning(f"解析馆藏条目时出错: {str(e)}")
-                        continue
+            holdings = self._parse_book_details(response.text)
+            self.capture.capture('detail', detail_params, response.text, holdings)
             
             logger.info(f"成功获取 {len(holdings)} 条馆藏信息")
             return holdings
             
+        except CircuitOpenError as e:
+            logger.warning(f"跳过详情请求，record_id: {record_id}: {str(e)}")
+            return None
+        except DeadlineExceeded as e:
+            logger.warning(f"详情请求到达截止时间，record_id: {record_id}: {str(e)}")
+            return None
         except Exception as e:
             logger.error(f"获取图书详情时出错: {str(e)}")
             import traceback
             logger.error(f"错误详情: {traceback.format_exc()}")
-            return []
+            return None
+    
+    def _parse_book_details(self, html_content, engine=None):
+        """解析详情页中物理馆藏选项卡（#tab1）的馆藏信息
+        
+        engine为None时使用DETAIL_PARSER配置的引擎，lxml解析失败时回退到BeautifulSoup。
+        """
+        logger = logging.getLogger('OPACSpider')
+        engine = engine or DETAIL_PARSER
+        if engine == 'lxml':
+            try:
+                return self._parse_book_details_lxml(html_content)
+            except Exception as e:
+                logger.warning(f"lxml解析详情页失败，回退到BeautifulSoup: {str(e)}")
+        return self._parse_book_details_bs4(html_content)
+    
+    def _parse_book_details_lxml(self, html_content):
+        """使用lxml XPath直接解析馆藏信息，结果与_parse_book_details_bs4一致"""
+        logger = logging.getLogger('OPACSpider')
+        holdings = []
+        
+        document = lxml.html.document_fromstring(html_content)
+        tab1 = document.xpath(_TAB1_XPATH)
+        if not tab1:
+            return holdings
+        
+        loc_items = tab1[0].xpath(_LOC_ITEM_XPATH)
+        logger.info(f"找到 {len(loc_items)} 个馆藏条目")
+        
+        for item in loc_items:
+            try:
+                loc_title = item.xpath(_LOC_TITLE_XPATH)
+                if not loc_title:
+                    continue
+                title_text = _lxml_text(loc_title[0])
+                location_status = title_text.split('|')
+                location = location_status[0].strip() if len(location_status) > 0 else '未知馆藏地'
+                status = location_status[1].strip() if len(location_status) > 1 else '未知状态'
+                
+                # 提取索书号（第一个|之前的内容）
+                loc_info = item.xpath(_LOC_INFO_XPATH)
+                call_number = ''
+                if loc_info:
+                    info_text = _lxml_text(loc_info[0])
+                    call_number = info_text.split('|')[0].strip()
+                
+                holdings.append({
+                    'callNumber': call_number,
+                    'location': location,
+                    'status': status
+                })
+            except Exception as e:
+                logger.warning(f"解析馆藏条目时出错: {str(e)}")
+                continue
+        
+        return holdings
+    
+    def _parse_book_details_bs4(self, html_content):
+        """使用BeautifulSoup解析馆藏信息"""
+        logger = logging.getLogger('OPACSpider')
+        soup = BeautifulSoup(html_content, 'lxml')
+        
+        # 提取物理馆藏信息
+        holdings = []
+        
+        # 查找物理馆藏选项卡
+        tab1 = soup.select_one('#tab1')
+        if tab1:
+            # 查找所有馆藏条目
+            loc_items = tab1.select('.loc_item')
+            logger.info(f"找到 {len(loc_items)} 个馆藏条目")
+            
+            for item in loc_items:
+                try:
+                    # 提取馆藏地和状态
+                    loc_title = item.select_one('.loc_title')
+                    if loc_title:
+                        title_text = _soup_text(loc_title)
+                        # 解析馆藏地和状态
+                        location_status = title_text.split('|')
+                        location = location_status[0].strip() if len(location_status) > 0 else '未知馆藏地'
+                        status = location_status[1].strip() if len(location_status) > 1 else '未知状态'
+                        
+                        # 提取索书号
+                        loc_info = item.select_one('.loc_info')
+                        call_number = ''
+                        if loc_info:
+                            info_text = _soup_text(loc_info)
+                            # 提取索书号（第一个|之前的内容）
+                            if '|' in info_text:
+                                call_number = info_text.split('|')[0].strip()
+                            else:
+                                call_number = info_text.strip()
+                        
+                        holding = {
+                            'callNumber': call_number,
+                            'location': location,
+                            'status': status
+                        }
+                        holdings.append(holding)
+                except Exception as e:
+                    logger.warning(f"解析馆藏条目时出错: {str(e)}")
+                    continue
+        
+        return holdings
+    
+    def _submit_detail(self, record_id, allow_stale=True, deadline=None):
+        """提交一个馆藏信息获取任务，返回concurrent.futures.Future"""
+        if _background.get():
+            # 后台任务在自己的线程中同步获取，不与用户请求争抢详情线程池
+            future = Future()
+            try:
+                future.set_result(self.get_book_details(record_id, allow_stale, deadline))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self.detail_executor.submit(self.get_book_details, record_id, allow_stale, deadline)
+    
+    def get_holdings_batch(self, record_ids, allow_stale=True, deadline=None):
+        """并发获取多本图书的馆藏信息，返回 {recordId: 馆藏列表}
+        
+        到达截止时间deadline时取消尚未开始的请求，结果中只包含已获取到的recordId。
+        """
+        logger = logging.getLogger('OPACSpider')
+        # 去重并保持顺序
+        unique_ids = list(dict.fromkeys(record_id for record_id in record_ids if record_id))
+        if not unique_ids:
+            return {}
+        
+        logger.info(f"并发获取 {len(unique_ids)} 本图书的馆藏信息，并发上限: {DETAIL_FETCH_WORKERS}")
+        futures = [self._submit_detail(record_id, allow_stale, deadline) for record_id in unique_ids]
+        done, not_done = wait(futures, timeout=time_left(deadline))
+        if not_done:
+            # 已开始的请求在后台完成并写入缓存，尚未开始的直接取消
+            logger.warning(f"获取馆藏信息到达截止时间，{len(not_done)} 本图书未完成")
+            for future in not_done:
+                future.cancel()
+        results = {}
+        for record_id, future in zip(unique_ids, futures):
+            if future not in done:
+                continue
+            try:
+                results[record_id] = future.result()
+            except DeadlineExceeded:
+                continue
+            except Exception as e:
+                # get_book_details内部已处理异常，这里仅作兜底
+                logger.warning(f"获取馆藏信息失败，record_id: {record_id}，错误: {str(e)}")
+                results[record_id] = []
+        return results
+    
+    def _fill_holdings(self, books, allow_stale=True, deadline=None):
+        """并发获取每本图书的馆藏信息，结果按原顺序写回books
+        
+        到达截止时间仍未获取到馆藏的图书标记holdingsPending，全部获取到时返回True。
+        """
+        holdings_map = self.get_holdings_batch([book.get('recordId') for book in books], allow_stale, deadline)
+        complete = True
+        for book in books:
+            record_id = book.get('recordId')
+            if record_id in holdings_map:
+                # 同一recordId出现多次时各自持有一份副本
+                book['holdings'] = [dict(holding) for holding in holdings_map[record_id]]
+            elif record_id:
+                book['holdingsPending'] = True
+                complete = False
+        return complete
     
     def _parse_html_response(self, html_content, title, max_results):
-        """解析HTML响应获取图书信息"""
+        """解析HTML响应获取图书信息，未找到图书时回退到模拟数据"""
+        books = self._parse_books(html_content, title, max_results)
+        if books:
+            self._fill_holdings(books)
+            return books
+        return self._get_mock_data(title, max_results)
+    
+    def _extract_embedded_json(self, html_content):
+        """从页面脚本的 var data = {...} 中解码JSON对象，找不到时返回None"""
+        logger = logging.getLogger('OPACSpider')
+        for match in _EMBEDDED_JSON_ANCHOR.finditer(html_content):
+            try:
+                data, end = _JSON_DECODER.raw_decode(html_content, match.end())
+            except json.JSONDecodeError as e:
+                logger.warning(f"解析JSON数据出错: {str(e)}")
+                continue
+            if isinstance(data, dict):
+                logger.info("找到包含JSON数据的JavaScript代码")
+                logger.debug(f"提取到的JSON字符串前500字符: {html_content[match.end():min(end, match.end() + 500)]}...")
+                return data
+        return None
+    
+    def _find_book_list(self, data):
+        """在解码后的JSON中查找图书列表，结构不符合预期时返回None"""
+        logger = logging.getLogger('OPACSpider')
+        # 尝试不同的路径查找图书数据
+        if isinstance(data.get('list'), list):
+            return data['list']
+        if isinstance(data.get('data'), dict) and isinstance(data['data'].get('list'), list):
+            return data['data']['list']
+        logger.warning("JSON数据结构不符合预期")
+        return None
+    
+    def _parse_books(self, html_content, title, max_results):
+        """解析HTML响应获取书目信息和recordId（不含馆藏），未找到图书时返回空列表"""
         logger = logging.getLogger('OPACSpider')
         logger.info("尝试解析HTML响应")
         
-        # 添加更多调试信息，将HTML内容保存到文件
-        debug_file = f'd:\\easier-nju-lib\\debug_html_response_{title}.html'
-        with open(debug_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        logger.info(f"HTML响应已保存到调试文件: {debug_file}")
-        logger.info(f"HTML内容前1000个字符: {html_content[:1000]}...")
+        logger.debug(f"HTML内容前1000个字符: {html_content[:1000]}...")
         
         # 1. 首先尝试从JavaScript代码中提取JSON数据
         logger.info("尝试从JavaScript代码中提取JSON数据")
         
-        # 查找包含图书数据的JavaScript代码
-        json_data_match = re.search(r'var\s+data\s*=\s*(\{.*?\});\s*\\/\\/\s*获取数据', html_content, re.DOTALL)
-        if not json_data_match:
-            # 尝试其他可能的模式
-            json_data_match = re.search(r'var\s+data\s*=\s*(\{.*?\});', html_content, re.DOTALL)
+        # 定位 var data = 后只解码一个JSON值，不受字符串中 }; 等字符影响
+        data = self._extract_embedded_json(html_content)
+        book_list = self._find_book_list(data) if data is not None else None
         
-        if json_data_match:
-            logger.info("找到包含JSON数据的JavaScript代码")
-            json_str = json_data_match.group(1)
-            logger.debug(f"提取到的JSON字符串前500字符: {json_str[:500]}...")
+        if book_list is not None:
+            logger.info(f"从JSON中找到 {len(book_list)} 本图书")
+            books = []
             
-            try:
-                # 解析JSON数据
-                data = json.loads(json_str)
-                logger.debug(f"成功解析JSON数据")
-                
-                # 从JSON数据中提取图书列表
-                books = []
-                
-                # 检查JSON结构
-                if isinstance(data, dict):
-                    # 尝试不同的路径查找图书数据
-                    if 'list' in data:
-                        book_list = data['list']
-                    elif 'data' in data and isinstance(data['data'], dict) and 'list' in data['data']:
-                        book_list = data['data']['list']
-                    else:
-                        logger.warning("JSON数据结构不符合预期")
-                        book_list = []
+            # 解析每本图书
+            for book_data in book_list[:max_results]:
+                try:
+                    record_id = book_data.get('recordId')
+                    book = {
+                        'title': book_data.get('title', f'未命名图书 {len(books)+1}'),
+                        'author': book_data.get('author', '未知作者'),
+                        'publisher': book_data.get('publisher', '未知出版社'),
+                        'year': book_data.get('year', ''),
+                        'recordId': str(record_id) if record_id else '',
+                        'holdings': []
+                    }
                     
-                    logger.info(f"从JSON中找到 {len(book_list)} 本图书")
-                    
-                    # 解析每本图书
-                    for book_data in book_list[:max_results]:
-                        try:
-                            book = {
-                                'title': book_data.get('title', f'未命名图书 {len(books)+1}'),
-                                'author': book_data.get('author', '未知作者'),
-                                'publisher': book_data.get('publisher', '未知出版社'),
-                                'year': book_data.get('year', ''),
-                                'holdings': []
-                            }
-                            
-                            # 获取馆藏信息
-                            record_id = book_data.get('recordId')
-                            if record_id:
-                                book['holdings'] = self.get_book_details(record_id)
-                            
-                            books.append(book)
-                            logger.info(f"从JSON解析到图书: {book['title']}")
-                        except Exception as e:
-                            logger.warning(f"解析单条JSON图书记录出错: {str(e)}")
-                            import traceback
-                            logger.warning(f"错误详情: {traceback.format_exc()}")
-                            continue
-                    
-                    if books:
-                        logger.info(f"JSON解析完成，共找到 {len(books)} 本图书")
-                        return books
-                    else:
-                        logger.warning("JSON数据中没有有效的图书信息")
-                
-            except json.JSONDecodeError as e:
-                logger.warning(f"解析JSON数据出错: {str(e)}")
-                import traceback
-                logger.warning(f"错误详情: {traceback.format_exc()}")
+                    books.append(book)
+                    logger.info(f"从JSON解析到图书: {book['title']}")
+                except Exception as e:
+                    logger.warning(f"解析单条JSON图书记录出错: {str(e)}")
+                    import traceback
+                    logger.warning(f"错误详情: {traceback.format_exc()}")
+                    continue
+            
+            # JSON路径成功时不再用BeautifulSoup解析整个页面
+            if books:
+                logger.info(f"JSON解析完成，共找到 {len(books)} 本图书")
+            else:
+                logger.warning("JSON数据中没有有效的图书信息")
+            return books
         
         # 2. 如果从JavaScript中提取JSON失败，尝试解析HTML结构
         logger.info("尝试直接解析HTML结构")
@@ -328,18 +1114,14 @@ class OPACSpider:
                     if record_match:
                         record_id = record_match.group(1)
                 
-                # 获取图书详情
-                holdings = []
-                if record_id:
-                    holdings = self.get_book_details(record_id)
-                
-                # 创建图书对象
+                # 创建图书对象，馆藏信息稍后获取
                 book = {
                     'title': title_text,
                     'author': author_text,
                     'publisher': publisher_text,
                     'year': year,
-                    'holdings': holdings  # 添加馆藏信息列表
+                    'recordId': record_id,
+                    'holdings': []  # 馆藏信息列表
                 }
                 
                 books.append(book)
@@ -355,7 +1137,7 @@ class OPACSpider:
             return books
         else:
             logger.warning("HTML响应中未找到图书数据")
-            return self._get_mock_data(title, max_results)
+            return []
     
     def _get_mock_data(self, title, max_results=10):
         """获取基于真实馆藏的模拟图书数据"""
@@ -485,5 +1267,25 @@ class OPACSpider:
         return filtered_books
 
 
-# 创建一个全局爬虫实例
-spider = OPACSpider()
\ No newline at end of file
+# 爬虫引擎：requests（默认）或 async（基于asyncio和aiohttp，见async_spider.py）
+SPIDER_ENGINE = os.environ.get('OPAC_SPIDER_ENGINE', 'requests')
+
+_spider = None
+_spider_lock = threading.Lock()
+
+
+def get_spider():
+    """返回进程内共享的爬虫实例，首次调用时按OPAC_SPIDER_ENGINE创建
+
+    只创建所选引擎的实例，导入本模块不会创建爬虫（及其线程池、缓存和熔断器）。
+    """
+    global _spider
+    with _spider_lock:
+        if _spider is None:
+            if SPIDER_ENGINE == 'async':
+                # async_spider导入了本模块，在这里导入以避免循环导入
+                from async_spider import AsyncOPACSpider
+                _spider = AsyncOPACSpider()
+            else:
+                _spider = OPACSpider()
+        return _spider
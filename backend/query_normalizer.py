@@ -0,0 +1,102 @@
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# 是否将繁体字折叠为简体字（使用下方的本地对照表）
+QUERY_FOLD_VARIANTS = os.environ.get('OPAC_QUERY_FOLD_VARIANTS', '1') == '1'
+# 统计命中率时记录的最近搜索键数量（与搜索缓存容量一致时近似缓存命中率）
+QUERY_STATS_WINDOW = int(os.environ.get('OPAC_QUERY_STATS_WINDOW', '512'))
+
+# 常用繁体字 -> 简体字对照表，每项为“繁简”两个字
+# 只收录书名中常见且一一对应的字，乾/干、著/着等有歧义的字不做转换
+_VARIANT_PAIRS = '''
+書书 電电 腦脑 計计 門门 問问 題题 機机 會会 學学 習习 讀读 寫写 說说 話话 語语
+開开 發发 實实 現现 應应 經经 濟济 歷历 國国 華华 資资 訊讯 統统 圖图 館馆 藝艺
+術术 設设 網网 絡络 數数 據据 庫库 與与 為为 這这 個个 們们 來来 時时 後后 從从
+對对 當当 無无 動动 將将 還还 樣样 種种 麼么 長长 關关 點点 體体 變变 處处 過过
+進进 頭头 義义 論论 車车 東东 產产 業业 專专 區区 醫医 藥药 療疗 衛卫 環环 態态
+類类 聲声 線线 導导 創创 傳传 歐欧 亞亚 蘭兰 羅罗 馬马 紅红 樓楼 夢梦 詩诗 詞词
+戲戏 劇剧 樂乐 畫画 憶忆 愛爱 戀恋 親亲 歲岁 鄉乡 風风 雲云 雙双 鳥鸟 魚鱼 龍龙
+飛飞 島岛 灣湾 臺台 陽阳 陰阴 漢汉 譯译 註注 軟软 碼码 組组 織织 構构 級级 際际
+規规 劃划 議议 質质 萬万 億亿 兩两 錢钱 貨货 銀银 財财 務务 貿贸 買买 賣卖 價价
+費费 險险 證证 場场 測测 試试 驗验 報报 紙纸 雜杂 誌志 記记 錄录 歸归 納纳 邏逻
+輯辑 幾几 積积 復复 優优 運运 營营 銷销 廣广 維维 護护 備备 驅驱 號号 氣气 溫温
+熱热 聽听 視视 覺觉 響响 顏颜 裡里 裏里 簡简 筆笔 譜谱 範范 調调 參参 講讲 練练
+課课 師师 誤误 錯错 條条 聯联 繫系 係系 結结 編编 輸输 權权 頁页 觀观 異异 識识
+換换 標标 寶宝 擬拟 貓猫
+'''
+_VARIANT_TABLE = str.maketrans({pair[0]: pair[1] for pair in _VARIANT_PAIRS.split()})
+
+
+def legacy_query_key(query):
+    """规范化之前的缓存键：只去除多余空白并转为小写（用于对比命中率）"""
+    return ' '.join(query.split()).lower()
+
+
+def normalize_query(query, fold_variants=QUERY_FOLD_VARIANTS):
+    """将搜索词规范化为缓存、合并请求和搜索历史使用的键
+
+    依次进行Unicode NFKC规范化（全角转半角等）、空白折叠、大小写折叠，
+    fold_variants为True时再将繁体字转换为简体字。
+    """
+    query = unicodedata.normalize('NFKC', query)
+    query = ' '.join(query.split()).casefold()
+    if fold_variants:
+        query = query.translate(_VARIANT_TABLE)
+    return query
+
+
+class QueryNormalizer:
+    """规范化搜索词并统计规范化对命中率的影响，线程安全
+
+    分别以规范化前后的键记录最近window个不同的搜索，
+    重复出现的键计为一次命中，近似对比两种键的缓存命中率（不考虑过期时间）。
+    """
+
+    def __init__(self, window=QUERY_STATS_WINDOW, fold_variants=QUERY_FOLD_VARIANTS):
+        self.window = window
+        self.fold_variants = fold_variants
+        self._lock = threading.Lock()
+        self._legacy_keys = OrderedDict()
+        self._keys = OrderedDict()
+        self.queries = 0
+        self.changed = 0
+        self.legacy_hits = 0
+        self.hits = 0
+
+    def normalize(self, query):
+        """返回规范化后的搜索词并记录统计"""
+        key = normalize_query(query, self.fold_variants)
+        legacy_key = legacy_query_key(query)
+        with self._lock:
+            self.queries += 1
+            if key != legacy_key:
+                self.changed += 1
+            self.legacy_hits += self._observe(self._legacy_keys, legacy_key)
+            self.hits += self._observe(self._keys, key)
+        return key
+
+    def _observe(self, keys, key):
+        # 需在持有锁时调用，返回1表示该键最近出现过
+        hit = key in keys
+        keys[key] = True
+        keys.move_to_end(key)
+        while len(keys) > self.window:
+            keys.popitem(last=False)
+        return 1 if hit else 0
+
+    def stats(self):
+        """返回规范化前后的命中率对比"""
+        with self._lock:
+            legacy_rate = self.legacy_hits / self.queries if self.queries else 0.0
+            rate = self.hits / self.queries if self.queries else 0.0
+            return {
+                'fold_variants': self.fold_variants,
+                'window': self.window,
+                'queries': self.queries,
+                'changed': self.changed,
+                'legacy_hit_rate': round(legacy_rate, 4),
+                'hit_rate': round(rate, 4),
+                'hit_rate_gain': round(rate - legacy_rate, 4)
+            }
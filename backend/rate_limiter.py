@@ -0,0 +1,171 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+
+class TokenBucket:
+    """令牌桶：每秒补充rate个令牌，最多积累burst个（调用方负责加锁）"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now):
+        """距离有一个可用令牌还需等待的秒数"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+# 协程排在其他请求之后时无法被条件变量唤醒，按此间隔（秒）重新检查
+ASYNC_POLL_INTERVAL = 0.01
+
+
+class OutboundRateLimiter:
+    """进程内共享的上游请求限流器
+
+    所有请求先经过全局令牌桶，再经过各自端点的令牌桶。
+    令牌不足时按优先级排队（数值越小越优先），同一优先级先到先得。
+    线程通过acquire等待，协程通过acquire_async等待，两者共用同一个队列。
+    记录各端点的排队次数和等待时间。
+    """
+
+    def __init__(self, global_rate, global_burst, endpoints=None):
+        self._global = TokenBucket(global_rate, global_burst)
+        # 端点名 -> (令牌桶, 优先级)
+        self._endpoints = {
+            name: (TokenBucket(rate, burst), priority)
+            for name, (rate, burst, priority) in (endpoints or {}).items()
+        }
+        self._cond = threading.Condition()
+        self._waiters = []  # (优先级, 序号) 小顶堆
+        self._counter = itertools.count()
+        self._metrics = {}
+
+    def acquire(self, endpoint, timeout=None):
+        """获取一个请求配额，返回等待的秒数；超过timeout仍未获取到时抛出TimeoutError"""
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        with self._cond:
+            bucket, ticket = self._enqueue(endpoint)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._try_take(ticket, bucket, now)
+                    if wait == 0:
+                        break
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            raise TimeoutError(f'等待上游请求配额超时: {endpoint}')
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._dequeue(ticket)
+            waited = time.monotonic() - start
+            self._record(endpoint, waited)
+        return waited
+
+    async def acquire_async(self, endpoint, timeout=None):
+        """acquire的协程版本：等待期间通过asyncio.sleep让出事件循环，不占用线程"""
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        with self._cond:
+            bucket, ticket = self._enqueue(endpoint)
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    wait = self._try_take(ticket, bucket, now)
+                    if wait == 0:
+                        break
+                    if wait is None:
+                        # 尚未轮到，至少等到令牌补充后再检查
+                        wait = max(self._wait_time(bucket, now), ASYNC_POLL_INTERVAL)
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise TimeoutError(f'等待上游请求配额超时: {endpoint}')
+                    wait = min(wait, remaining)
+                await asyncio.sleep(wait)
+        finally:
+            with self._cond:
+                self._dequeue(ticket)
+        with self._cond:
+            waited = time.monotonic() - start
+            self._record(endpoint, waited)
+        return waited
+
+    def waiting(self, max_priority=None):
+        """正在排队的请求数；指定max_priority时只统计优先级数值不大于它的请求"""
+        with self._cond:
+            if max_priority is None:
+                return len(self._waiters)
+            return sum(1 for priority, _ in self._waiters if priority <= max_priority)
+
+    def _enqueue(self, endpoint):
+        # 以下方法需在持有锁时调用
+        bucket, priority = self._endpoints.get(endpoint, (None, 0))
+        ticket = (priority, next(self._counter))
+        heapq.heappush(self._waiters, ticket)
+        return bucket, ticket
+
+    def _dequeue(self, ticket):
+        self._waiters.remove(ticket)
+        heapq.heapify(self._waiters)
+        # 唤醒下一个排队者
+        self._cond.notify_all()
+
+    def _wait_time(self, bucket, now):
+        return max(self._global.wait_time(now), bucket.wait_time(now) if bucket else 0.0)
+
+    def _try_take(self, ticket, bucket, now):
+        """轮到ticket且令牌充足时取走令牌并返回0，否则返回还需等待的秒数；尚未轮到时返回None"""
+        if self._waiters[0] != ticket:
+            return None
+        wait = self._wait_time(bucket, now)
+        if wait == 0:
+            self._global.take()
+            if bucket:
+                bucket.take()
+        return wait
+
+    def _record(self, endpoint, waited):
+        metrics = self._metrics.setdefault(endpoint, {'requests': 0, 'queued': 0, 'total_wait': 0.0, 'max_wait': 0.0})
+        metrics['requests'] += 1
+        if waited > 0.001:
+            metrics['queued'] += 1
+        metrics['total_wait'] += waited
+        metrics['max_wait'] = max(metrics['max_wait'], waited)
+
+    def stats(self):
+        """返回限流配置和各端点的等待时间统计"""
+        with self._cond:
+            endpoints = {}
+            for name, metrics in self._metrics.items():
+                endpoints[name] = {
+                    'requests': metrics['requests'],
+                    'queued': metrics['queued'],
+                    'avg_wait_ms': round(metrics['total_wait'] / metrics['requests'] * 1000, 2),
+                    'max_wait_ms': round(metrics['max_wait'] * 1000, 2)
+                }
+            for name, (bucket, priority) in self._endpoints.items():
+                endpoints.setdefault(name, {}).update({'rate': bucket.rate, 'burst': bucket.burst, 'priority': priority})
+            return {
+                'global_rate': self._global.rate,
+                'global_burst': self._global.burst,
+                'waiting': len(self._waiters),
+                'endpoints': endpoints
+            }
@@ -0,0 +1,152 @@
+import copy
+import marshal
+import sys
+
+
+def _intern(value):
+    # 馆藏地、借阅状态、出版社等取值有限，驻留后所有记录共享同一个字符串对象
+    return sys.intern(value) if type(value) is str else value
+
+
+class Holding:
+    """一条馆藏记录（索书号、馆藏地、借阅状态）的紧凑表示"""
+
+    __slots__ = ('call_number', 'location', 'status')
+
+    def __init__(self, call_number, location, status):
+        self.call_number = call_number
+        self.location = _intern(location)
+        self.status = _intern(status)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('callNumber', ''), data.get('location', ''), data.get('status', ''))
+
+    def to_dict(self):
+        return {'callNumber': self.call_number, 'location': self.location, 'status': self.status}
+
+    def to_tuple(self):
+        return (self.call_number, self.location, self.status)
+
+    @classmethod
+    def from_tuple(cls, data):
+        return cls(*data)
+
+
+class Book:
+    """一本图书及其馆藏的紧凑表示
+
+    爬虫返回的图书字典只包含固定的几个字段，其余字段（如有）保存在extra中，
+    转换回字典时保持原有的JSON结构。
+    """
+
+    __slots__ = ('title', 'author', 'publisher', 'year', 'record_id', 'holdings', 'extra')
+
+    _FIELDS = ('title', 'author', 'publisher', 'year', 'recordId', 'holdings')
+
+    def __init__(self, title, author, publisher, year, record_id, holdings=(), extra=None):
+        self.title = title
+        self.author = author
+        self.publisher = _intern(publisher)
+        self.year = _intern(year)
+        self.record_id = record_id
+        self.holdings = holdings
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        extra = {key: value for key, value in data.items() if key not in cls._FIELDS}
+        return cls(
+            data.get('title', ''),
+            data.get('author', ''),
+            data.get('publisher', ''),
+            data.get('year', ''),
+            data.get('recordId', ''),
+            encode_holdings(data.get('holdings') or ()),
+            extra or None
+        )
+
+    def to_dict(self):
+        data = {
+            'title': self.title,
+            'author': self.author,
+            'publisher': self.publisher,
+            'year': self.year,
+            'recordId': self.record_id,
+            'holdings': decode_holdings(self.holdings)
+        }
+        if self.extra:
+            data.update(copy.deepcopy(self.extra))
+        return data
+
+    def to_tuple(self):
+        return (self.title, self.author, self.publisher, self.year, self.record_id,
+                tuple(holding.to_tuple() for holding in self.holdings), self.extra)
+
+    @classmethod
+    def from_tuple(cls, data):
+        title, author, publisher, year, record_id, holdings, extra = data
+        return cls(title, author, publisher, year, record_id,
+                   tuple(Holding.from_tuple(holding) for holding in holdings), extra)
+
+
+def encode_holdings(holdings):
+    """馆藏字典列表 -> Holding元组"""
+    return tuple(Holding.from_dict(holding) for holding in holdings)
+
+
+def decode_holdings(holdings):
+    """Holding元组 -> 新的馆藏字典列表"""
+    return [holding.to_dict() for holding in holdings]
+
+
+def encode_books(books):
+    """图书字典列表 -> Book元组"""
+    return tuple(Book.from_dict(book) for book in books)
+
+
+def decode_books(books):
+    """Book元组 -> 新的图书字典列表"""
+    return [book.to_dict() for book in books]
+
+
+# 写入共享缓存的二进制格式：各字段组成的元组经marshal序列化，不含字段名
+MARSHAL_VERSION = 4
+
+
+def dumps_holdings(holdings):
+    """Holding元组 -> 二进制数据"""
+    return marshal.dumps(tuple(holding.to_tuple() for holding in holdings), MARSHAL_VERSION)
+
+
+def loads_holdings(data):
+    """二进制数据 -> Holding元组"""
+    return tuple(Holding.from_tuple(holding) for holding in marshal.loads(data))
+
+
+def dumps_books(books):
+    """Book元组 -> 二进制数据"""
+    return marshal.dumps(tuple(book.to_tuple() for book in books), MARSHAL_VERSION)
+
+
+def loads_books(data):
+    """二进制数据 -> Book元组"""
+    return tuple(Book.from_tuple(book) for book in marshal.loads(data))
+
+
+class HoldingsCodec:
+    """供TTLCache使用：以Holding元组保存馆藏列表，读取时还原为字典；dumps/loads用于共享缓存"""
+
+    encode = staticmethod(encode_holdings)
+    decode = staticmethod(decode_holdings)
+    dumps = staticmethod(dumps_holdings)
+    loads = staticmethod(loads_holdings)
+
+
+class BooksCodec:
+    """供TTLCache使用：以Book元组保存搜索结果，读取时还原为字典；dumps/loads用于共享缓存"""
+
+    encode = staticmethod(encode_books)
+    decode = staticmethod(decode_books)
+    dumps = staticmethod(dumps_books)
+    loads = staticmethod(loads_books)
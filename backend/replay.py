@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# 回放采样的上游页面：用当前解析器重新解析并与采样时的结果对比，同时统计解析耗时
+#
+# 用法: python replay.py [采样目录] [--kind search|detail] [--repeat N] [--compare-engines]
+#
+# --compare-engines 对详情页分别使用lxml和BeautifulSoup解析，检查两者结果一致并分别统计耗时
+#
+# fixtures/ 中保存了手工构造的页面（含脚本、样式和注释等边界情况），修改解析器后运行
+#   python replay.py fixtures --compare-engines
+# 检查两种解析引擎的结果一致且与预期结果相同
+import argparse
+import logging
+import sys
+import time
+
+from capture import load_captures
+from opac_spider import OPACSpider, CAPTURE_DIR
+
+
+DETAIL_ENGINES = ['lxml', 'bs4']
+
+
+def parse_capture(spider, record, engine=None):
+    """用当前解析器解析一个采样页面，engine只对详情页有效"""
+    if record['kind'] == 'search':
+        params = record.get('params') or {}
+        return spider._parse_books(record['html'], params.get('searchFieldContent', ''), int(params.get('rows', 10)))
+    return spider._parse_book_details(record['html'], engine)
+
+
+def time_parse(spider, record, repeat, engine=None):
+    """返回 (解析结果, 平均每次解析耗时)"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parsed = parse_capture(spider, record, engine)
+    return parsed, (time.perf_counter() - start) / repeat
+
+
+def print_timings(timings):
+    for name, values in sorted(timings.items()):
+        values.sort()
+        print(f'{name}: {len(values)} 个页面, 平均 {sum(values) / len(values) * 1000:.2f} ms, '
+              f'中位数 {values[len(values) // 2] * 1000:.2f} ms, 最大 {values[-1] * 1000:.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回放采样的图书馆页面，检查解析结果并统计解析耗时')
+    parser.add_argument('directory', nargs='?', default=CAPTURE_DIR, help='采样目录')
+    parser.add_argument('--kind', choices=['search', 'detail'], help='只回放指定类型的页面')
+    parser.add_argument('--repeat', type=int, default=1, help='每个页面重复解析的次数')
+    parser.add_argument('--compare-engines', action='store_true', help='对比详情页各解析引擎的结果和耗时')
+    args = parser.parse_args()
+
+    # 回放时关闭解析器的逐条日志，避免影响耗时统计
+    logging.getLogger('OPACSpider').setLevel(logging.WARNING)
+    spider = OPACSpider()
+
+    timings = {}
+    mismatches = []
+    for record in load_captures(args.directory, args.kind):
+        if args.compare_engines and record['kind'] == 'detail':
+            results = {}
+            for engine in DETAIL_ENGINES:
+                results[engine], elapsed = time_parse(spider, record, args.repeat, engine)
+                timings.setdefault(f'detail[{engine}]', []).append(elapsed)
+            parsed = results[DETAIL_ENGINES[0]]
+            if any(result != parsed for result in results.values()):
+                mismatches.append(f"{record['file']}（解析引擎结果不一致）")
+        else:
+            parsed, elapsed = time_parse(spider, record, args.repeat)
+            timings.setdefault(record['kind'], []).append(elapsed)
+        if record.get('parsed') is not None and parsed != record['parsed']:
+            mismatches.append(record['file'])
+
+    if not timings:
+        print(f'目录中没有采样页面: {args.directory}')
+        return 1
+
+    print_timings(timings)
+
+    if mismatches:
+        print(f'{len(mismatches)} 个页面的解析结果不一致:')
+        for name in mismatches:
+            print(f'  {name}')
+        return 1
+    print('所有页面的解析结果与采样时一致')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger('OPACSpider')
+
+# 多进程共享缓存的SQLite文件路径，为空时各进程只使用自己的内存缓存
+SHARED_CACHE_PATH = os.environ.get('OPAC_SHARED_CACHE_PATH', '')
+# 等待其他进程释放写锁的最长时间（毫秒）
+SHARED_CACHE_BUSY_TIMEOUT = int(os.environ.get('OPAC_SHARED_CACHE_BUSY_TIMEOUT', '2000'))
+# 最近访问时间的更新精度（秒），避免每次读取都写入数据库
+SHARED_CACHE_TOUCH_INTERVAL = float(os.environ.get('OPAC_SHARED_CACHE_TOUCH_INTERVAL', '30'))
+
+
+class SharedCacheStore:
+    """基于SQLite（WAL模式）的缓存存储，同一主机上的多个进程共享
+
+    每个TTLCache使用一个命名空间，值为序列化后的二进制数据。写入时间使用墙上时钟，
+    因此各进程计算出的缓存时间一致，重启后缓存仍然有效。容量按命名空间在写入时统一淘汰
+    最久未访问的条目；最近访问时间按touch_interval的精度更新，LRU顺序是近似的。
+    每个线程使用独立的连接，数据库出错时记录日志并视为未命中，不影响请求。
+    """
+
+    def __init__(self, path=SHARED_CACHE_PATH, busy_timeout=SHARED_CACHE_BUSY_TIMEOUT,
+                 touch_interval=SHARED_CACHE_TOUCH_INTERVAL):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.touch_interval = touch_interval
+        self._local = threading.local()
+        self.errors = 0
+        conn = self._connect()
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    value BLOB NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed
+                ON cache_entries (namespace, accessed_at)
+            ''')
+        logger.info(f"共享缓存已启用: {path}")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            cache_dir = os.path.dirname(self.path)
+            if cache_dir and not os.path.exists(cache_dir):
+                os.makedirs(cache_dir, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout / 1000, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout)}')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def encode_key(key):
+        # 缓存键为字符串或由字符串/整数组成的元组，JSON编码后作为主键
+        return json.dumps(key, ensure_ascii=False)
+
+    def get(self, namespace, key):
+        """返回(写入时间, 二进制值)，不存在时返回None"""
+        key = self.encode_key(key)
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                'SELECT stored_at, accessed_at, value FROM cache_entries WHERE namespace = ? AND key = ?',
+                (namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            stored_at, accessed_at, value = row
+            now = time.time()
+            if now - accessed_at >= self.touch_interval:
+                conn.execute(
+                    'UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?',
+                    (now, namespace, key)
+                )
+            return stored_at, value
+        except sqlite3.Error as e:
+            self._error('读取', e)
+            return None
+
+    def set(self, namespace, key, value, max_size):
+        """写入条目，并淘汰该命名空间中超出max_size的最久未访问条目，返回淘汰的条目数"""
+        key = self.encode_key(key)
+        now = time.time()
+        try:
+            conn = self._connect()
+            # 连接为自动提交模式（isolation_level=None），with conn不会开启事务，
+            # 需显式开启写事务，保证写入和淘汰对其他进程是原子的
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(
+                    'INSERT OR REPLACE INTO cache_entries (namespace, key, stored_at, accessed_at, value) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (namespace, key, now, now, value)
+                )
+                cursor = conn.execute('''
+                    DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                        SELECT key FROM cache_entries WHERE namespace = ?
+                        ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                    )
+                ''', (namespace, namespace, max_size))
+                conn.execute('COMMIT')
+            except BaseException:
+                # 部分错误下SQLite已自动回滚事务
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                raise
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            self._error('写入', e)
+            return 0
+
+    def delete(self, namespace, key):
+        try:
+            self._connect().execute(
+                'DELETE FROM cache_entries WHERE namespace = ? AND key = ?',
+                (namespace, self.encode_key(key))
+            )
+        except sqlite3.Error as e:
+            self._error('删除', e)
+
+    def clear(self, namespace):
+        try:
+            self._connect().execute('DELETE FROM cache_entries WHERE namespace = ?', (namespace,))
+        except sqlite3.Error as e:
+            self._error('清空', e)
+
+    def count(self, namespace):
+        try:
+            return self._connect().execute(
+                'SELECT COUNT(*) FROM cache_entries WHERE namespace = ?', (namespace,)
+            ).fetchone()[0]
+        except sqlite3.Error as e:
+            self._error('统计', e)
+            return 0
+
+    def _error(self, action, error):
+        self.errors += 1
+        logger.warning(f"共享缓存{action}失败: {str(error)}")
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'errors': self.errors
+        }
+
+
+# 未配置路径时为None，缓存只保存在进程内
+shared_store = SharedCacheStore() if SHARED_CACHE_PATH else None
@@ -0,0 +1,83 @@
+import copy
+import threading
+
+
+class _Call:
+    """一次正在进行中的调用"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """合并相同key的并发调用：同一时刻只有一个线程真正执行，其余线程等待并共享结果
+
+    执行出错时，所有等待的线程都会收到同一个异常。
+    共享的结果会复制给每个调用方（包括执行者），避免调用方之间互相修改。
+    等待的线程可以指定各自的超时时间，超时后不再等待（执行中的调用不受影响）。
+    """
+
+    def __init__(self, name='singleflight'):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def do(self, key, fn, *args, timeout=None, **kwargs):
+        """执行fn(*args, **kwargs)，相同key的并发调用只执行一次
+
+        timeout只限制等待其他线程执行结果的时间（秒），超时抛出TimeoutError；
+        执行者自身不受timeout限制，由fn自行控制耗时。
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            if not call.done.wait(timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise TimeoutError(f'等待合并的请求超时: {self.name}')
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return copy.deepcopy(call.result)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def in_flight(self):
+        """当前正在执行的调用数"""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        """返回合并统计信息"""
+        with self._lock:
+            return {
+                'name': self.name,
+                'in_flight': len(self._calls),
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'timeouts': self.timeouts
+            }
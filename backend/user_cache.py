@@ -0,0 +1,38 @@
+import os
+
+from cache import TTLCache
+
+# 用户信息（用户名、校区）缓存的条目数和过期时间（秒）
+# 多进程部署时其他进程的缓存不会被立即失效，修改校区后最多USER_CACHE_TTL秒内可能读到旧值
+USER_CACHE_SIZE = int(os.environ.get('OPAC_USER_CACHE_SIZE', '1024'))
+USER_CACHE_TTL = int(os.environ.get('OPAC_USER_CACHE_TTL', '60'))
+
+
+class UserCache:
+    """按用户ID缓存用户名和校区，避免每个请求多次查询users表
+
+    只缓存存在的用户；修改用户信息后需调用invalidate。
+    """
+
+    def __init__(self, db, max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        self.db = db
+        self._cache = TTLCache(max_size=max_size, ttl=ttl, name='users')
+
+    def get(self, user_id):
+        """返回 {'id', 'username', 'campus'}，用户不存在时返回None"""
+        user_id = int(user_id)
+        user = self._cache.get(user_id)
+        if user is not None:
+            return user
+        row = self.db.get_user_by_id(user_id)
+        if not row:
+            return None
+        user = {'id': row[0], 'username': row[1], 'campus': row[3]}
+        self._cache.set(user_id, user)
+        return user
+
+    def invalidate(self, user_id):
+        self._cache.delete(int(user_id))
+
+    def stats(self):
+        return self._cache.stats()
@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('OPACSpider')
+
+# 是否启用缓存预热；默认关闭，多进程部署时只应在一个进程中开启
+WARMUP_ENABLED = os.environ.get('OPAC_WARMUP_ENABLED', '0') == '1'
+# 每轮预热的热门搜索词数量
+WARMUP_TOP_K = int(os.environ.get('OPAC_WARMUP_TOP_K', '20'))
+# 预热间隔（秒），启动后立即执行第一轮
+WARMUP_INTERVAL = float(os.environ.get('OPAC_WARMUP_INTERVAL', '300'))
+# 同时预热的搜索词数量
+WARMUP_CONCURRENCY = int(os.environ.get('OPAC_WARMUP_CONCURRENCY', '2'))
+# 每轮最多发往图书馆的请求数（每个搜索词按1次搜索加max_results次详情估算）
+WARMUP_BUDGET = int(os.environ.get('OPAC_WARMUP_BUDGET', '100'))
+# 统计热门搜索词的时间范围（天）和权重半衰期（天）
+WARMUP_WINDOW_DAYS = int(os.environ.get('OPAC_WARMUP_WINDOW_DAYS', '14'))
+WARMUP_HALF_LIFE_DAYS = float(os.environ.get('OPAC_WARMUP_HALF_LIFE_DAYS', '3'))
+
+
+class CacheWarmer:
+    """根据搜索历史在后台预热搜索结果和馆藏缓存
+
+    启动后立即执行一轮，之后每隔interval秒执行一次。每轮取加权后的前top_k个搜索词，
+    跳过在下一轮之前不会过期的缓存，其余的通过spider.refresh_books_by_title重新获取。
+    所有工作都在预热自己的线程中完成，不占用请求线程和详情线程池；上游请求经spider.background()
+    使用最低优先级的限流端点，不与用户请求争抢配额。
+    """
+
+    def __init__(self, spider, db, top_k=WARMUP_TOP_K, interval=WARMUP_INTERVAL,
+                 concurrency=WARMUP_CONCURRENCY, budget=WARMUP_BUDGET, max_results=10):
+        self.spider = spider
+        self.db = db
+        self.top_k = top_k
+        self.interval = interval
+        self.concurrency = concurrency
+        self.budget = budget
+        self.max_results = max_results
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.warmed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.last_run = None
+
+    def start(self):
+        """启动后台预热线程（重复调用无效）"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name='cache-warmer', daemon=True)
+        self._thread.start()
+        logger.info(f"缓存预热已启动，间隔: {self.interval} 秒，每轮最多 {self.top_k} 个搜索词")
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"缓存预热失败: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def run_once(self):
+        """执行一轮预热，返回本轮实际刷新的搜索词"""
+        start = time.monotonic()
+        popular = self.db.get_popular_queries(self.top_k, WARMUP_WINDOW_DAYS, WARMUP_HALF_LIFE_DAYS)
+        queries = []
+        spent = 0
+        cost = 1 + self.max_results
+        for item in popular:
+            if not self._needs_refresh(item['query']):
+                self.skipped += 1
+                continue
+            if spent + cost > self.budget:
+                break
+            queries.append(item['query'])
+            spent += cost
+
+        if queries:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='cache-warmer') as executor:
+                for books in executor.map(self._refresh, queries):
+                    if books:
+                        self.warmed += 1
+                    else:
+                        self.failed += 1
+
+        self.runs += 1
+        self.last_run = {
+            'candidates': len(popular),
+            'refreshed': len(queries),
+            'estimated_requests': spent,
+            'duration': round(time.monotonic() - start, 2)
+        }
+        logger.info(f"缓存预热完成: {self.last_run}")
+        return queries
+
+    def _needs_refresh(self, query):
+        # 缓存在下一轮预热之前就会过期时才刷新；get_stale不计入缓存命中率
+        cache_key = (self.spider._normalize_title(query), 1, self.max_results)
+        entry = self.spider.search_cache.get_stale(cache_key)
+        if entry is None:
+            return True
+        return entry[1] + self.interval >= self.spider.search_cache.soft_ttl
+
+    def _refresh(self, query):
+        try:
+            with self.spider.background():
+                return self.spider.refresh_books_by_title(query, max_results=self.max_results)
+        except Exception as e:
+            logger.warning(f"预热搜索词失败: {query}: {str(e)}")
+            return []
+
+    def stats(self):
+        return {
+            'enabled': self._thread is not None,
+            'top_k': self.top_k,
+            'interval': self.interval,
+            'concurrency': self.concurrency,
+            'budget': self.budget,
+            'runs': self.runs,
+            'warmed': self.warmed,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'last_run': self.last_run
+        }
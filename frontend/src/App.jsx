@@ -3,6 +3,11 @@ import React from 'react';
 import SearchBar from './components/SearchBar';
 import BookCard from './components/BookCard';
 import AdminDashboard from './components/AdminDashboard';
+
+// 馆藏信息未在服务器截止时间内获取到时的重试次数和间隔（毫秒）
+const MAX_HOLDINGS_RETRIES = 2;
+const HOLDINGS_RETRY_DELAY = 1500;
+
 function App() {
   // 将App组件导出到全局作用域
   window.App = App;
@@ -21,6 +26,8 @@ function App() {
   const [showHistoryModal, setShowHistoryModal] = React.useState(false);
   // 后台管理
   const [showAdminDashboard, setShowAdminDashboard] = React.useState(false);
+  // 当前搜索的序号，用于丢弃已被新搜索取代的上游结果
+  const searchSeqRef = React.useRef(0);
 
   // 初始化时获取用户信息和搜索历史
   React.useEffect(() => {
@@ -283,6 +290,7 @@ function App() {
     setLoading(true);
     setError(null);
     setHasSearched(true);
+    const searchSeq = ++searchSeqRef.current;
 
     try {
       if (!token) {
@@ -296,6 +304,9 @@ function App() {
       let url = `/api/search?query=${encodeURIComponent(query)}`;
       if (location) {
         url += `&location=${encodeURIComponent(location)}`;
+      } else {
+        // 未筛选馆藏地时先返回书目信息（优先使用本地书目，先行显示），馆藏信息随后加载
+        url += '&holdings=lazy&source=local';
       }
 
       // 直接调用后端服务地址，添加认证token
@@ -325,7 +336,16 @@ function App() {
       }
 
       // 直接使用后端返回的图书数组（而不是data.books）
-      setBooks(Array.isArray(data) ? data : []);
+      const bookList = Array.isArray(data) ? data : [];
+      setBooks(bookList);
+
+      // 异步加载尚未获取的馆藏信息
+      fetchPendingHoldings(bookList);
+
+      // 本地书目可能不完整，先显示本地结果，再以上游搜索结果为准合并
+      if (response.headers.get('X-Data-Source') === 'local') {
+        fetchUpstreamBooks(query, bookList, searchSeq);
+      }
 
       // 搜索历史由后端自动记录，不再需要前端单独保存
 
@@ -339,6 +359,84 @@ function App() {
     }
   }
 
+  // 请求上游搜索结果替换本地结果，已加载的馆藏信息按recordId保留
+  const fetchUpstreamBooks = async (query, localBooks, searchSeq) => {
+    let upstreamBooks;
+    try {
+      // refresh=1：同一次搜索的补充请求，服务器不重复记录搜索历史
+      const url = `/api/search?query=${encodeURIComponent(query)}&holdings=lazy&source=upstream&refresh=1`;
+      const response = await fetch(url, { headers: { 'Authorization': `Bearer ${token}` } });
+      if (!response.ok) {
+        console.error('获取上游搜索结果失败:', response.status);
+        return;
+      }
+      const data = await response.json();
+      upstreamBooks = Array.isArray(data) ? data : [];
+    } catch (err) {
+      console.error('获取上游搜索结果失败:', err);
+      return;
+    }
+    // 期间用户发起了新的搜索，或上游没有结果时保留本地结果
+    if (searchSeq !== searchSeqRef.current || upstreamBooks.length === 0) return;
+
+    setBooks(prev => {
+      const loaded = {};
+      prev.forEach(book => {
+        if (book.recordId && !book.holdingsPending) loaded[book.recordId] = book;
+      });
+      return upstreamBooks.map(book => {
+        const local = loaded[book.recordId];
+        return local ? { ...book, holdings: local.holdings, holdingsPending: false, dataAge: local.dataAge } : book;
+      });
+    });
+
+    // 本地结果中已在加载的馆藏由之前的请求填入，这里只加载新增图书的馆藏
+    const localIds = localBooks.map(book => book.recordId);
+    fetchPendingHoldings(upstreamBooks.filter(book => !localIds.includes(book.recordId)));
+  };
+
+  // 批量获取馆藏信息并填入对应图书，服务器到达截止时间仍未获取到的稍后重试
+  const fetchPendingHoldings = async (bookList, attempt = 0) => {
+    const recordIds = bookList.filter(book => book.holdingsPending && book.recordId).map(book => book.recordId);
+    if (recordIds.length === 0) return;
+
+    let holdingsMap = {};
+    let agesMap = {};
+    let pendingIds = [];
+    try {
+      const response = await fetch('/api/holdings', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${token}`
+        },
+        body: JSON.stringify({ recordIds })
+      });
+      if (response.ok) {
+        const data = await response.json();
+        holdingsMap = data.holdings || {};
+        agesMap = data.ages || {};
+        pendingIds = attempt < MAX_HOLDINGS_RETRIES ? (data.pending || []) : [];
+      } else {
+        console.error('获取馆藏信息失败:', response.status);
+      }
+    } catch (err) {
+      console.error('获取馆藏信息失败:', err);
+    }
+
+    // 只更新仍在当前结果中的图书，失败时不再显示加载状态
+    setBooks(prev => prev.map(book => {
+      if (!book.holdingsPending || !recordIds.includes(book.recordId)) return book;
+      if (pendingIds.includes(book.recordId)) return book;
+      return { ...book, holdings: holdingsMap[book.recordId] || [], holdingsPending: false, dataAge: agesMap[book.recordId] };
+    }));
+
+    if (pendingIds.length > 0) {
+      const pendingBooks = bookList.filter(book => pendingIds.includes(book.recordId));
+      setTimeout(() => fetchPendingHoldings(pendingBooks, attempt + 1), HOLDINGS_RETRY_DELAY);
+    }
+  };
+
   // 认证模态框组件
   const AuthModal = () => {
     const [username, setUsername] = React.useState('');
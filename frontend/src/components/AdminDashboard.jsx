@@ -1,12 +1,38 @@
 import React, { useState, useEffect } from 'react';
 import './AdminDashboard.css';
 
+// 访问日志每页条数
+const ACCESS_LOG_PAGE_SIZE = 50;
+
+const EMPTY_LOG_FILTERS = {
+  userId: '',
+  path: '',
+  status: '',
+  ip: '',
+  since: '',
+  until: ''
+};
+
+// datetime-local输入的本地时间 -> 后端使用的UTC时间（YYYY-MM-DD HH:MM:SS）
+const toUtcParam = (value) => {
+  if (!value) return '';
+  return new Date(value).toISOString().slice(0, 19).replace('T', ' ');
+};
+
+// 后端返回的UTC时间 -> 本地时间
+const formatUtcTime = (value) => new Date(value.replace(' ', 'T') + 'Z').toLocaleString();
+
 const AdminDashboard = () => {
   const [statistics, setStatistics] = useState(null);
   const [users, setUsers] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [activeTab, setActiveTab] = useState('statistics');
+  const [accessLogs, setAccessLogs] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [logFilters, setLogFilters] = useState(EMPTY_LOG_FILTERS);
+  const [logsLoading, setLogsLoading] = useState(false);
+  const [logsError, setLogsError] = useState(null);
 
   // 检查用户是否已登录且是管理员
   const checkAdmin = async () => {
@@ -73,6 +99,60 @@ const AdminDashboard = () => {
     }
   };
 
+  // 获取访问日志：cursor为空时按当前筛选条件重新查询，否则加载下一页
+  const fetchAccessLogs = async (cursor = null) => {
+    const token = localStorage.getItem('token');
+    if (!token) return;
+
+    const params = new URLSearchParams({ limit: ACCESS_LOG_PAGE_SIZE });
+    if (logFilters.userId) params.set('user_id', logFilters.userId);
+    if (logFilters.path) params.set('path', logFilters.path);
+    if (logFilters.status) params.set('status', logFilters.status);
+    if (logFilters.ip) params.set('ip', logFilters.ip);
+    if (logFilters.since) params.set('since', toUtcParam(logFilters.since));
+    if (logFilters.until) params.set('until', toUtcParam(logFilters.until));
+    if (cursor) params.set('cursor', cursor);
+
+    setLogsLoading(true);
+    setLogsError(null);
+    try {
+      const response = await fetch(`/api/admin/access-logs?${params}`, {
+        headers: {
+          'Authorization': `Bearer ${token}`
+        }
+      });
+      const data = await response.json();
+
+      if (response.ok) {
+        setAccessLogs(prev => cursor ? [...prev, ...data.logs] : data.logs);
+        setNextCursor(data.next_cursor);
+      } else {
+        setLogsError(data.error || '获取访问日志失败');
+      }
+    } catch (err) {
+      setLogsError('获取访问日志失败');
+    } finally {
+      setLogsLoading(false);
+    }
+  };
+
+  const handleLogFilterChange = (e) => {
+    const { name, value } = e.target;
+    setLogFilters(prev => ({ ...prev, [name]: value }));
+  };
+
+  const handleLogSearch = (e) => {
+    e.preventDefault();
+    fetchAccessLogs();
+  };
+
+  // 第一次打开访问日志时加载第一页
+  useEffect(() => {
+    if (activeTab === 'logs' && accessLogs.length === 0 && !logsLoading) {
+      fetchAccessLogs();
+    }
+  }, [activeTab]);
+
   // 初始化数据
   useEffect(() => {
     const init = async () => {
@@ -120,6 +200,12 @@ const AdminDashboard = () => {
         >
           用户管理
         </button>
+        <button
+          className={activeTab === 'logs' ? 'active' : ''}
+          onClick={() => setActiveTab('logs')}
+        >
+          访问日志
+        </button>
       </div>
 
       <div className="admin-content">
@@ -168,6 +254,62 @@ const AdminDashboard = () => {
             </table>
           </div>
         )}
+
+        {activeTab === 'logs' && (
+          <div className="logs-panel">
+            <h2>访问日志</h2>
+            <form className="logs-filters" onSubmit={handleLogSearch}>
+              <input name="userId" type="number" min="1" placeholder="用户ID" value={logFilters.userId} onChange={handleLogFilterChange} />
+              <input name="path" placeholder="路径前缀，如 /api/search" value={logFilters.path} onChange={handleLogFilterChange} />
+              <input name="status" type="number" placeholder="状态码" value={logFilters.status} onChange={handleLogFilterChange} />
+              <input name="ip" placeholder="IP地址" value={logFilters.ip} onChange={handleLogFilterChange} />
+              <label>
+                从
+                <input name="since" type="datetime-local" value={logFilters.since} onChange={handleLogFilterChange} />
+              </label>
+              <label>
+                到
+                <input name="until" type="datetime-local" value={logFilters.until} onChange={handleLogFilterChange} />
+              </label>
+              <button type="submit" disabled={logsLoading}>查询</button>
+              <button type="button" onClick={() => setLogFilters(EMPTY_LOG_FILTERS)}>重置</button>
+            </form>
+
+            {logsError && <div className="logs-error">{logsError}</div>}
+
+            <table className="users-table logs-table">
+              <thead>
+                <tr>
+                  <th>时间</th>
+                  <th>用户</th>
+                  <th>IP</th>
+                  <th>请求</th>
+                  <th>状态码</th>
+                </tr>
+              </thead>
+              <tbody>
+                {accessLogs.map(log => (
+                  <tr key={log.id}>
+                    <td>{formatUtcTime(log.access_time)}</td>
+                    <td>{log.username ? `${log.username} (${log.user_id})` : '-'}</td>
+                    <td>{log.ip_address}</td>
+                    <td>{log.request_method} {log.request_path}</td>
+                    <td>{log.status_code}</td>
+                  </tr>
+                ))}
+              </tbody>
+            </table>
+
+            {!logsLoading && accessLogs.length === 0 && !logsError && (
+              <div className="logs-empty">没有符合条件的访问日志</div>
+            )}
+            {nextCursor && (
+              <button className="logs-more" onClick={() => fetchAccessLogs(nextCursor)} disabled={logsLoading}>
+                {logsLoading ? '加载中...' : '加载更多'}
+              </button>
+            )}
+          </div>
+        )}
       </div>
     </div>
   );
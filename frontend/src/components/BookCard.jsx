@@ -2,7 +2,7 @@
 import React from 'react';
 
 const BookCard = ({ book }) => {
-  const { title, author, publisher, year, holdings } = book;
+  const { title, author, publisher, year, holdings, holdingsPending, dataAge } = book;
 
   // 获取状态颜色的辅助函数
   const getStatusColor = (status) => {
@@ -28,6 +28,13 @@ const BookCard = ({ book }) => {
       location: holding.location || '未知',
       status: holding.status || '未知状态'
     }));
+  } else if (holdingsPending) {
+    // 馆藏信息加载中
+    holdingsToDisplay.push({
+      callNumber: '加载中...',
+      location: '加载中...',
+      status: '馆藏信息加载中'
+    });
   } else {
     // 默认馆藏信息
     holdingsToDisplay.push({
@@ -36,6 +43,11 @@ const BookCard = ({ book }) => {
       status: '未知状态'
     });
   }
+  // 数据来自缓存超过1分钟时显示更新时间
+  const updatedText = dataAge >= 60
+    ? (dataAge >= 3600 ? `${Math.floor(dataAge / 3600)}小时前更新` : `${Math.floor(dataAge / 60)}分钟前更新`)
+    : null;
+
   // 使用React.createElement替代JSX
   return React.createElement('div', { className: 'book-card' },
     React.createElement('div', { className: 'book-card-header' },
@@ -54,7 +66,8 @@ const BookCard = ({ book }) => {
             React.createElement('span', { className: 'book-call-number' }, `索书号: ${holding.callNumber}`),
             React.createElement('span', { className: 'book-location' }, `馆藏地: ${holding.location}`)
           )
-        )
+        ),
+        updatedText && React.createElement('p', { className: 'book-updated' }, updatedText)
       )
     )
   );